@@ -1,13 +1,27 @@
 import streamlit as st
-import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 
+from taxi import instrument, ledger
+from taxi.db import data_generation, tracked_transaction
+from taxi.migrations import ensure_schema
+from taxi.money import PAY_CODES, PAY_NAL, fmt_amount, fmt_rub, to_kopecks, to_rub
+from taxi.orders import add_order
+from taxi.shifts import (
+    close_shift,
+    get_latest_orders,
+    get_max_order_id,
+    get_older_orders_page,
+    get_open_shift,
+    get_shift_totals,
+    open_shift,
+)
+
 # ===== НАСТРОЙКИ =====
-DB_NAME = "taxi.db"
-rate_nal = 0.78        # процент для нала (для расчёта комиссии)
-rate_card = 0.75       # процент для карты
 FUEL_PRICE = 55.0      # цена бензина за литр
 FUEL_CONSUMPTION = 8.0 # расход л/100 км
+ORDERS_SHOWN = 5       # последние заказы смены, показанные карточками
+ORDERS_PAGE_SIZE = 20  # строк на странице более ранних заказов
 
 
 # ===== КАСТОМНЫЙ ДИЗАЙН / CSS =====
@@ -82,228 +96,296 @@ def apply_custom_css():
     )
 
 
-# ===== ФУНКЦИИ БД =====
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+# ===== ШАБЛОН СМЕНЫ =====
+def get_shift_template():
+    today = datetime.now().strftime("%Y-%m-%d")
+    return {
+        "date": today,
+        "planned_km": 200,
+        "planned_hours": 8,
+        "note": "",
+    }
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS shifts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            km INTEGER DEFAULT 0,
-            fuel_liters REAL DEFAULT 0,
-            fuel_price REAL DEFAULT 0,
-            is_open INTEGER DEFAULT 1,
-            opened_at TEXT,
-            closed_at TEXT
-        )
-        """
-    )
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            shift_id INTEGER,
-            type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            tips REAL DEFAULT 0,
-            commission REAL NOT NULL,
-            total REAL NOT NULL,
-            beznal_added REAL DEFAULT 0,
-            order_time TEXT
+# ===== СОСТОЯНИЕ СЕССИИ =====
+# Открытая смена, её итоги, последние заказы и баланс хранятся в
+# st.session_state вместе с поколением БД (db.data_generation()). Пока
+# поколение то же, rerun не делает ни одного запроса к таблицам. После
+# своего заказа снимок дополняется на месте; чужие записи (другая
+# вкладка, админка, импорт) меняют поколение, и снимок перечитывается.
+def load_shift_view() -> dict:
+    # поколение — до чтения данных: запись между ними вызовет перечитывание
+    generation = data_generation()
+    view = {
+        "generation": generation,
+        "shift": get_open_shift(),
+        "balance": ledger.current_balance(),
+        "max_order_id": get_max_order_id(),
+        "totals": None,
+        "latest": [],
+        "older_pages": {},
+    }
+    if view["shift"]:
+        shift_id = view["shift"][0]
+        view["totals"] = get_shift_totals(shift_id)
+        view["latest"] = get_latest_orders(shift_id, ORDERS_SHOWN)
+    return view
+
+
+def get_shift_view() -> dict:
+    view = st.session_state.get("shift_view")
+    if view is None or view["generation"] != data_generation():
+        view = load_shift_view()
+        st.session_state.shift_view = view
+    return view
+
+
+def append_order_to_view(view: dict, order_row, generation: dict) -> bool:
+    """
+    Дописывает только что сохранённый заказ в снимок смены.
+
+    order_row — (id, pay_type, amount, tips, commission, total, beznal_added, order_time),
+    generation — поколения из db.tracked_transaction() вокруг записи заказа.
+    Если до нашей транзакции кто-то писал в БД, снимок сбрасывается и
+    перечитается целиком. Если кто-то записал сразу после неё, снимок
+    дополняется, но остаётся со старым поколением — следующий rerun его
+    перечитает, а не примет чужую запись за увиденную.
+    """
+    order_id, pay_type, amount, tips, _, total, beznal_added, _ = order_row
+    if view["generation"] != generation["before"] or order_id != view["max_order_id"] + 1:
+        st.session_state.pop("shift_view", None)
+        return False
+
+    totals = view["totals"]
+    totals["нал" if pay_type == PAY_NAL else "карта"] += total - tips
+    totals["чаевые"] += tips
+    totals["безнал_смена"] += beznal_added
+    totals["заказов"] += 1
+    view["balance"] += beznal_added
+    view["latest"] = (view["latest"] + [order_row])[-ORDERS_SHOWN:]
+    view["older_pages"] = {}
+    view["max_order_id"] = order_id
+    if generation["after"] is not None:
+        view["generation"] = generation["after"]
+    return True
+
+
+def get_older_orders_cached(view: dict, page: int):
+    """Страница ранних заказов из снимка; запрос — только при первом показе."""
+    if page not in view["older_pages"]:
+        view["older_pages"][page] = get_older_orders_page(
+            view["shift"][0], view["latest"][0][0], page, ORDERS_PAGE_SIZE
         )
-        """
-    )
-    # на случай старой таблицы без order_time
+    return view["older_pages"][page]
+
+
+# ===== ФРАГМЕНТЫ СМЕНЫ =====
+# Панель заказов, список и итоги — фрагменты: сохранение заказа
+# перезапускает только панель (без CSS, проверки схемы и закрытия смены),
+# а листание ранних заказов — только список.
+@contextmanager
+def shift_view_checked():
+    """Внутри блока снимок уже сверен с БД: вложенные фрагменты не перепроверяют."""
+    outer = st.session_state.get("shift_view_checked", False)
+    st.session_state.shift_view_checked = True
     try:
-        cursor.execute("ALTER TABLE orders ADD COLUMN order_time TEXT")
-    except sqlite3.OperationalError:
-        pass
+        yield
+    finally:
+        st.session_state.shift_view_checked = outer
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS accumulated_beznal (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            driver_id INTEGER DEFAULT 1,
-            total_amount REAL DEFAULT 0,
-            last_updated TEXT
-        )
-        """
-    )
 
-    cursor.execute("SELECT id FROM accumulated_beznal WHERE driver_id = 1")
-    if not cursor.fetchone():
-        cursor.execute(
-            "INSERT INTO accumulated_beznal "
-            "(driver_id, total_amount, last_updated) "
-            "VALUES (1, 0, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),),
-        )
+def current_shift_view(shift_id) -> dict:
+    if st.session_state.get("shift_view_checked") and "shift_view" in st.session_state:
+        view = st.session_state.shift_view
+    else:
+        view = get_shift_view()
+    if not view["shift"] or view["shift"][0] != shift_id:
+        # смену закрыли или открыли другую в соседней сессии
+        st.rerun()
+    return view
 
-    conn.commit()
-    conn.close()
 
+@st.fragment
+@instrument.section("app.order_panel")
+def order_panel(shift_id):
+    view = current_shift_view(shift_id)
+    # баланс заполняется после обработки формы — уже с новым заказом
+    balance_slot = st.empty()
 
-def get_open_shift():
-    """Возвращает (id, date) открытой смены или None."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, date FROM shifts WHERE is_open = 1 LIMIT 1")
-    row = cursor.fetchone()
-    conn.close()
-    return row
+    # ===== Форма добавления заказа =====
+    with st.expander("➕ Добавить заказ", expanded=True):
+        with st.form("order_form"):
+            c1, c2 = st.columns(2)
+            with c1:
+                amount = st.number_input(
+                    "Сумма заказа, ₽", min_value=0.0, step=50.0, format="%.2f"
+                )
+            with c2:
+                payment = st.selectbox("Тип оплаты", ["нал", "карта"])
 
+            tips = st.number_input(
+                "Чаевые, ₽ (без комиссии)", min_value=0.0, step=10.0, value=0.0
+            )
 
-def open_shift(date_str: str) -> int:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        "INSERT INTO shifts (date, is_open, opened_at) VALUES (?, 1, ?)",
-        (date_str, now),
-    )
-    shift_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return shift_id
+            st.caption(f"Текущее время: {datetime.now().strftime('%H:%M')}")
 
+            submitted = st.form_submit_button("💾 Сохранить заказ")
 
-def close_shift_db(shift_id: int, km: int, liters: float, fuel_price: float):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        """
-        UPDATE shifts
-        SET is_open = 0, km = ?, fuel_liters = ?, fuel_price = ?, closed_at = ?
-        WHERE id = ?
-        """,
-        (km, liters, fuel_price, now, shift_id),
-    )
-    conn.commit()
-    conn.close()
-
-
-def add_order_db(
-    shift_id,
-    order_type,
-    amount,
-    tips,
-    commission,
-    total,
-    beznal_added,
-    order_time,
-):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO orders (shift_id, type, amount, tips, commission, total, beznal_added, order_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            shift_id,
-            order_type,
-            amount,
-            tips,
-            commission,
-            total,
-            beznal_added,
-            order_time,
-        ),
-    )
-    conn.commit()
-    conn.close()
+        if submitted and amount > 0:
+            order_time = datetime.now().strftime("%H:%M")
+            pay_type = PAY_CODES[payment]
+            amount_kop, tips_kop = to_kopecks(amount), to_kopecks(tips)
+
+            with tracked_transaction() as generation:
+                order_id, commission, total, beznal_added = add_order(
+                    shift_id, pay_type, amount_kop, tips_kop, order_time
+                )
+            if not append_order_to_view(
+                view,
+                (order_id, pay_type, amount_kop, tips_kop, commission, total, beznal_added, order_time),
+                generation,
+            ):
+                view = current_shift_view(shift_id)
+
+            st.success(f"✓ Сохранено. Вам сразу: {fmt_rub(total, 2)}")
+
+    if view["balance"] != 0:
+        balance_slot.metric("Накопленный безнал", fmt_rub(view["balance"]))
+
+    with shift_view_checked():
+        orders_list(shift_id)
+        shift_totals(shift_id)
+
+
+def set_orders_page(page_key: str, page: int):
+    st.session_state[page_key] = page
+
+
+@st.fragment
+@instrument.section("app.orders_list")
+def orders_list(shift_id):
+    # карточками — только последние ORDERS_SHOWN заказов, остальные
+    # постранично одной таблицей: отрисовка не растёт с длиной смены
+    view = current_shift_view(shift_id)
+    orders_count = view["totals"]["заказов"]
+    if not orders_count:
+        return
+
+    st.subheader("📋 Заказы за смену")
+
+    latest = view["latest"]
+    older_count = orders_count - len(latest)
+
+    if older_count > 0:
+        page_key = f"orders_page_{shift_id}"
+        pages = (older_count + ORDERS_PAGE_SIZE - 1) // ORDERS_PAGE_SIZE
+        page = min(st.session_state.get(page_key, 0), pages - 1)
+
+        with st.expander(f"🗂 Более ранние заказы ({older_count})"):
+            rows = get_older_orders_cached(view, page)
+            first_no = older_count - page * ORDERS_PAGE_SIZE
+            st.dataframe(
+                [
+                    {
+                        "#": first_no - j,
+                        "Время": order_time or "",
+                        "Тип": "Нал" if pay_type == PAY_NAL else "Карта",
+                        "Сумма": fmt_amount(amount),
+                        "Чаевые": fmt_amount(tips),
+                        "Вам": fmt_amount(total),
+                    }
+                    for j, (pay_type, amount, tips, total, order_time) in enumerate(rows)
+                ],
+                width="stretch",
+                hide_index=True,
+            )
+            if pages > 1:
+                p1, p2, p3 = st.columns([1, 2, 1])
+                p1.button(
+                    "← Новее",
+                    disabled=page == 0,
+                    key="orders_newer",
+                    on_click=set_orders_page,
+                    args=(page_key, page - 1),
+                )
+                p2.caption(f"Страница {page + 1} из {pages}")
+                p3.button(
+                    "Старее →",
+                    disabled=page >= pages - 1,
+                    key="orders_older",
+                    on_click=set_orders_page,
+                    args=(page_key, page + 1),
+                )
 
+    for i, (_, pay_type, amount, tips, comm, total, beznal_add, order_time) in enumerate(
+        latest, older_count + 1
+    ):
+        with st.container():
+            left, right = st.columns([2, 1])
+
+            with left:
+                time_str = f"{order_time} · " if order_time else ""
+                st.markdown(
+                    f"**#{i}** · {time_str}"
+                    f"{'💵 Нал' if pay_type == PAY_NAL else '💳 Карта'} · "
+                    f"{fmt_rub(amount)}"
+                )
+                details = []
+                if tips > 0:
+                    details.append(f"чаевые {fmt_rub(tips)}")
+                if beznal_add > 0:
+                    details.append(f"+{fmt_rub(beznal_add)} в безнал")
+                elif beznal_add < 0:
+                    details.append(f"{fmt_rub(beznal_add)} списано с безнала")
+                if details:
+                    st.caption(", ".join(details))
 
-def get_shift_orders(shift_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT type, amount, tips, commission, total, beznal_added, order_time
-        FROM orders
-        WHERE shift_id = ?
-        ORDER BY id
-        """,
-        (shift_id,),
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+            with right:
+                st.markdown(f"**Вам:** {fmt_rub(total)}")
 
+            st.divider()
 
-def get_shift_totals(shift_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
 
-    cursor.execute(
-        "SELECT type, SUM(total - tips) FROM orders "
-        "WHERE shift_id = ? GROUP BY type",
-        (shift_id,),
-    )
-    by_type = dict(cursor.fetchall())
+@st.fragment
+@instrument.section("app.shift_totals")
+def shift_totals(shift_id):
+    totals = current_shift_view(shift_id)["totals"]
+    if not totals["заказов"]:
+        return
+    nal = totals["нал"]
+    card = totals["карта"]
+    tips_sum = totals["чаевые"]
 
-    cursor.execute(
-        "SELECT SUM(tips), SUM(beznal_added) FROM orders WHERE shift_id = ?",
-        (shift_id,),
-    )
-    tips_sum, beznal_sum = cursor.fetchone()
-    tips_sum = tips_sum or 0
-    beznal_sum = beznal_sum or 0
-
-    conn.close()
-    by_type["чаевые"] = tips_sum
-    by_type["безнал_смена"] = beznal_sum
-    return by_type
-
-
-def get_accumulated_beznal():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT total_amount FROM accumulated_beznal WHERE driver_id = 1")
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 0.0
-
-
-def add_to_accumulated_beznal(amount: float):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        """
-        UPDATE accumulated_beznal
-        SET total_amount = total_amount + ?, last_updated = ?
-        WHERE driver_id = 1
-        """,
-        (amount, now),
-    )
-    conn.commit()
-    conn.close()
+    st.subheader("💼 Итоги по смене")
 
+    top = st.container()
+    bottom = st.container()
 
-def get_shift_template():
-    today = datetime.now().strftime("%Y-%m-%d")
-    return {
-        "date": today,
-        "planned_km": 200,
-        "planned_hours": 8,
-        "note": "",
-    }
+    with top:
+        c1, c2 = st.columns(2)
+        c1.metric("Нал", fmt_rub(nal))
+        c2.metric("Карта", fmt_rub(card))
+
+    with bottom:
+        c3, c4 = st.columns(2)
+        c3.metric("Чаевые", fmt_rub(tips_sum))
+        c4.metric("Изм. безнала", fmt_rub(totals["безнал_смена"]))
+
+    total_day = nal + card + tips_sum
+    st.caption(f"Всего за смену (до бензина): {fmt_rub(total_day)}")
 
 
 # ===== UI =====
 st.set_page_config(page_title="Такси учёт", page_icon="🚕", layout="centered")  # [web:811]
 apply_custom_css()
-init_db()
+with instrument.section("app.init_db"):
+    ensure_schema()
 
 st.title("🚕 Учёт работы такси")
 
-open_shift_data = get_open_shift()
+with instrument.section("app.shift_view"):
+    shift_view = get_shift_view()
+open_shift_data = shift_view["shift"]
 
 if not open_shift_data:
     st.info("Сейчас нет открытой смены.")
@@ -348,110 +430,8 @@ else:
     shift_id, date = open_shift_data
     st.success(f"📅 Открыта смена: {date}")
 
-    acc = get_accumulated_beznal()
-    if acc != 0:
-        st.metric("Накопленный безнал", f"{acc:.0f} ₽")
-
-    # ===== Форма добавления заказа =====
-    with st.expander("➕ Добавить заказ", expanded=True):
-        with st.form("order_form"):
-            c1, c2 = st.columns(2)
-            with c1:
-                amount = st.number_input(
-                    "Сумма заказа, ₽", min_value=0.0, step=50.0, format="%.2f"
-                )
-            with c2:
-                payment = st.selectbox("Тип оплаты", ["нал", "карта"])
-
-            tips = st.number_input(
-                "Чаевые, ₽ (без комиссии)", min_value=0.0, step=10.0, value=0.0
-            )
-
-            st.caption(f"Текущее время: {datetime.now().strftime('%H:%M')}")
-
-            submitted = st.form_submit_button("💾 Сохранить заказ")
-
-        if submitted and amount > 0:
-            order_time = datetime.now().strftime("%H:%M")
-
-            if payment == "нал":
-                typ = "нал"
-                final_wo_tips = amount
-                commission = amount * (1 - rate_nal)
-                total = amount + tips
-                beznal_added = -commission
-            else:
-                typ = "карта"
-                final_wo_tips = amount * rate_card
-                commission = amount - final_wo_tips
-                total = final_wo_tips + tips
-                beznal_added = final_wo_tips
-
-            add_order_db(
-                shift_id, typ, amount, tips, commission, total, beznal_added, order_time
-            )
-            if beznal_added != 0:
-                add_to_accumulated_beznal(beznal_added)
-
-            st.success(f"✓ Сохранено. Вам сразу: {total:.2f} ₽")
-            st.rerun()
-
-    # ===== Список заказов и итоги =====
-    orders = get_shift_orders(shift_id)
-    totals = get_shift_totals(shift_id) if orders else {}
-    nal = totals.get("нал", 0.0)
-    card = totals.get("карта", 0.0)
-    tips_sum = totals.get("чаевые", 0.0)
-    beznal_this = totals.get("безнал_смена", 0.0)
-
-    if orders:
-        st.subheader("📋 Заказы за смену")
-
-        for i, (typ, amount, tips, comm, total, beznal_add, order_time) in enumerate(
-            orders, 1
-        ):
-            with st.container():
-                left, right = st.columns([2, 1])
-
-                with left:
-                    time_str = f"{order_time} · " if order_time else ""
-                    st.markdown(
-                        f"**#{i}** · {time_str}"
-                        f"{'💵 Нал' if typ == 'нал' else '💳 Карта'} · "
-                        f"{amount:.0f} ₽"
-                    )
-                    details = []
-                    if tips > 0:
-                        details.append(f"чаевые {tips:.0f} ₽")
-                    if beznal_add > 0:
-                        details.append(f"+{beznal_add:.0f} ₽ в безнал")
-                    elif beznal_add < 0:
-                        details.append(f"{beznal_add:.0f} ₽ списано с безнала")
-                    if details:
-                        st.caption(", ".join(details))
-
-                with right:
-                    st.markdown(f"**Вам:** {total:.0f} ₽")
-
-                st.divider()
-
-        st.subheader("💼 Итоги по смене")
-
-        top = st.container()
-        bottom = st.container()
-
-        with top:
-            c1, c2 = st.columns(2)
-            c1.metric("Нал", f"{nal:.0f} ₽")
-            c2.metric("Карта", f"{card:.0f} ₽")
-
-        with bottom:
-            c3, c4 = st.columns(2)
-            c3.metric("Чаевые", f"{tips_sum:.0f} ₽")
-            c4.metric("Изм. безнала", f"{beznal_this:.0f} ₽")
-
-        total_day = nal + card + tips_sum
-        st.caption(f"Всего за смену (до бензина): {total_day:.0f} ₽")
+    with shift_view_checked():
+        order_panel(shift_id)
 
     # ===== Закрытие смены =====
     st.write("---")
@@ -474,9 +454,10 @@ else:
             if submitted_close:
                 liters = (km / 100) * FUEL_CONSUMPTION
                 fuel_cost = liters * FUEL_PRICE
-                close_shift_db(shift_id, km, liters, FUEL_PRICE)
+                close_shift(shift_id, km, liters, FUEL_PRICE)
 
-                income = nal + card + tips_sum
+                totals = shift_view["totals"]
+                income = to_rub(totals["нал"] + totals["карта"] + totals["чаевые"])
                 profit = income - fuel_cost
 
                 st.success("Смена закрыта.")
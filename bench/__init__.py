@@ -0,0 +1,9 @@
+"""
+Бенчмарки горячих путей taxi.db на синтетических данных.
+
+    python -m bench.run --sizes 1000 100000 1000000
+
+generate — детерминированный генератор смен и заказов, legacy — исходные
+реализации функций (запрос на смену, построчный пересчёт и импорт) для
+сравнения с текущими, run — замеры и запись результатов в JSON.
+"""
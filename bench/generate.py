@@ -0,0 +1,215 @@
+"""
+Детерминированный генератор синтетической БД и файлов импорта.
+
+Один водитель даёт ~ORDERS_PER_SHIFT заказов за смену; чтобы даты не
+уходили на века вперёд, большие объёмы раскладываются максимум на
+MAX_DAYS дней с несколькими сменами в день (как у таксопарка). Часы
+заказов — по профилю HOUR_WEIGHTS, тип оплаты — CARD_SHARE карт.
+
+    python -m bench.generate 100000 bench/data/orders_100000.db
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+from datetime import date, timedelta
+
+from taxi import dates, db, ledger, money, tariffs
+from taxi.migrations import migrate
+
+START_DATE = date(2021, 1, 1)
+MAX_DAYS = 5 * 365
+ORDERS_PER_SHIFT = 20
+CARD_SHARE = 0.65
+TIPS_SHARE = 0.15
+OPEN_HOUR = 6            # смена открывается в 06:00, заказы до 06:00 — после полуночи
+FUEL_CONSUMPTION = 8.0
+FUEL_PRICE = 55.0
+INSERT_BATCH = 50_000
+
+# относительная частота заказов по часам 0..23: утренний и вечерний пики
+HOUR_WEIGHTS = (
+    2, 1, 1, 1, 1, 2, 4, 8, 10, 9, 6, 5,
+    5, 5, 5, 6, 7, 9, 10, 9, 7, 5, 4, 3,
+)
+
+
+def _amount(rng: random.Random) -> int:
+    """Сумма заказа в копейках, кратная 10 ₽: логнормальная вокруг 450 ₽."""
+    rub = max(100, round(rng.lognormvariate(math.log(450), 0.45), -1))
+    return int(rub) * money.KOPECKS
+
+
+def _tips(rng: random.Random) -> int:
+    if rng.random() >= TIPS_SHARE:
+        return 0
+    return rng.choice((50, 100, 100, 150, 200)) * money.KOPECKS
+
+
+def _order_time(rng: random.Random) -> tuple[str, int]:
+    """("ЧЧ:ММ", секунды от начала дня смены с учётом перехода через полночь)."""
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    minute = rng.randrange(60)
+    offset = hour * 3600 + minute * 60
+    if hour < OPEN_HOUR:
+        offset += dates.DAY
+    return f"{hour:02d}:{minute:02d}", offset
+
+
+def layout(orders: int) -> tuple[int, int]:
+    """(дней, смен в день) для заданного числа заказов."""
+    shifts = max(1, orders // ORDERS_PER_SHIFT)
+    days = min(shifts, MAX_DAYS)
+    return days, math.ceil(shifts / days)
+
+
+def iter_orders(orders: int, seed: int = 0):
+    """
+    Порождает (дата, [(pay_type, amount, tips, order_time, offset)]) по сменам,
+    всего ровно orders заказов.
+    """
+    rng = random.Random(seed)
+    days, per_day = layout(orders)
+    shifts = days * per_day
+    left = orders
+    for n in range(shifts):
+        day = START_DATE + timedelta(days=n // per_day)
+        count = left // (shifts - n)
+        rows = []
+        for _ in range(count):
+            pay_type = money.PAY_CARD if rng.random() < CARD_SHARE else money.PAY_NAL
+            order_time, offset = _order_time(rng)
+            rows.append((pay_type, _amount(rng), _tips(rng), order_time, offset))
+        rows.sort(key=lambda row: row[4])
+        left -= count
+        yield day.isoformat(), rows
+
+
+def generate_db(path: str, orders: int, seed: int = 0) -> dict:
+    """
+    Создаёт БД path с orders заказами (файл перезаписывается).
+
+    Заказы пишутся пачками прямым INSERT — сводку смен и куб ведут
+    триггеры, как при работе приложения; в журнал безнала идёт одна запись
+    импорта на смену. Возвращает {"orders", "shifts", "path"}.
+    """
+    db.close_all_connections()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db.DB_NAME = path
+    migrate()
+
+    rng = random.Random(seed + 1)
+    conn = db.get_connection()
+    shift_count = 0
+    batch = []
+
+    def flush():
+        conn.executemany(
+            """
+            INSERT INTO orders (shift_id, pay_type, amount, tips, commission, total, beznal_added, order_time, ordered_at, tariff_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch,
+        )
+        batch.clear()
+
+    with db.transaction() as conn:
+        tariff_id, rate_nal, rate_card = tariffs.get_tariff(START_DATE.isoformat())
+        for date_str, rows in iter_orders(orders, seed):
+            day_ts = dates.date_to_epoch(date_str)
+            opened_ts = day_ts + OPEN_HOUR * 3600
+            closed_ts = day_ts + (rows[-1][4] if rows else OPEN_HOUR * 3600) + 15 * 60
+            km = rng.randrange(120, 320, 10)
+            liters = km / 100 * FUEL_CONSUMPTION
+            shift_id = conn.execute(
+                """
+                INSERT INTO shifts (date, date_ts, km, fuel_liters, fuel_price, is_open, opened_at, opened_ts, closed_at, closed_ts)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)
+                """,
+                (
+                    date_str,
+                    day_ts,
+                    km,
+                    liters,
+                    FUEL_PRICE,
+                    dates.from_epoch(opened_ts).strftime("%Y-%m-%d %H:%M:%S"),
+                    opened_ts,
+                    dates.from_epoch(closed_ts).strftime("%Y-%m-%d %H:%M:%S"),
+                    closed_ts,
+                ),
+            ).lastrowid
+            shift_count += 1
+
+            beznal = 0
+            for pay_type, amount, tips, order_time, offset in rows:
+                commission, total, beznal_added = tariffs.calc_order(
+                    pay_type, amount, tips, rate_nal, rate_card
+                )
+                beznal += beznal_added
+                batch.append(
+                    (shift_id, pay_type, amount, tips, commission, total,
+                     beznal_added, order_time, day_ts + offset, tariff_id)
+                )
+            if len(batch) >= INSERT_BATCH:
+                flush()
+            ledger.post(
+                conn, ledger.KIND_IMPORT, beznal, note=f"bench {date_str}",
+                effective_ts=ledger.day_end(day_ts),
+            )
+        if batch:
+            flush()
+
+    return {"orders": orders, "shifts": shift_count, "path": path}
+
+
+def import_rows(orders: int, seed: int = 0):
+    """Строки файла импорта: (Дата, Тип, Сумма в ₽, Чаевые в ₽)."""
+    for date_str, rows in iter_orders(orders, seed):
+        for pay_type, amount, tips, _, _ in rows:
+            yield (
+                date_str,
+                money.PAY_NAMES[pay_type],
+                money.to_rub(amount),
+                money.to_rub(tips) if tips else "",
+            )
+
+
+IMPORT_HEADER = ("Дата", "Тип", "Сумма", "Чаевые")
+
+
+def write_import_csv(path: str, orders: int, seed: int = 0) -> str:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(IMPORT_HEADER)
+        writer.writerows(import_rows(orders, seed))
+    return path
+
+
+def write_import_xlsx(path: str, orders: int, seed: int = 0) -> str:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(IMPORT_HEADER)
+    for row in import_rows(orders, seed):
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическая БД taxi.db")
+    parser.add_argument("orders", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    info = generate_db(args.path, args.orders, args.seed)
+    print(f"{info['path']}: {info['orders']} заказов, {info['shifts']} смен")
+
+
+if __name__ == "__main__":
+    main()
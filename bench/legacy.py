@@ -0,0 +1,255 @@
+"""
+Исходные реализации горячих путей — точка отсчёта для бенчмарков.
+
+Логика и порядок запросов как в первой версии приложения (новое
+соединение на вызов, запросы на каждую смену, разбор строк в Python,
+построчные UPDATE/INSERT). Перенесены на текущую схему: тип оплаты —
+pay_type, суммы — копейки, баланс — через журнал безнала.
+"""
+
+import sqlite3
+
+import pandas as pd
+
+from taxi import db, ledger, money, tariffs
+
+
+def get_connection():
+    return sqlite3.connect(db.DB_NAME)
+
+
+def get_shift_totals(shift_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT pay_type, SUM(total - tips) FROM orders "
+        "WHERE shift_id = ? GROUP BY pay_type",
+        (shift_id,),
+    )
+    by_type = {money.PAY_NAMES[t]: s for t, s in cursor.fetchall()}
+
+    cursor.execute(
+        "SELECT SUM(tips), SUM(beznal_added) FROM orders WHERE shift_id = ?",
+        (shift_id,),
+    )
+    tips_sum, beznal_sum = cursor.fetchone()
+    conn.close()
+    by_type["чаевые"] = tips_sum or 0
+    by_type["безнал_смена"] = beznal_sum or 0
+    return by_type
+
+
+def _month_shifts(cur, year_month: str):
+    cur.execute(
+        """
+        SELECT id, date, km, fuel_liters, fuel_price
+        FROM shifts
+        WHERE date LIKE ?
+          AND is_open = 0
+          AND EXISTS (SELECT 1 FROM orders o WHERE o.shift_id = shifts.id)
+        ORDER BY date
+        """,
+        (f"{year_month}%",),
+    )
+    return cur.fetchall()
+
+
+def _shift_sums(cur, shift_id):
+    cur.execute(
+        "SELECT pay_type, SUM(total - tips) FROM orders WHERE shift_id = ? GROUP BY pay_type",
+        (shift_id,),
+    )
+    by_type = dict(cur.fetchall())
+    cur.execute(
+        "SELECT SUM(tips), SUM(beznal_added) FROM orders WHERE shift_id = ?",
+        (shift_id,),
+    )
+    tips_sum, beznal_sum = cur.fetchone()
+    return (
+        by_type.get(money.PAY_NAL, 0) or 0,
+        by_type.get(money.PAY_CARD, 0) or 0,
+        tips_sum or 0,
+        beznal_sum or 0,
+    )
+
+
+def get_month_totals(year_month: str):
+    conn = get_connection()
+    cur = conn.cursor()
+    shifts = _month_shifts(cur, year_month)
+
+    total_nal = total_card = total_tips = total_beznal_add = 0
+    for shift_id, *_ in shifts:
+        nal, card, tips, beznal = _shift_sums(cur, shift_id)
+        total_nal += nal
+        total_card += card
+        total_tips += tips
+        total_beznal_add += beznal
+    conn.close()
+
+    return {
+        "нал": total_nal,
+        "карта": total_card,
+        "чаевые": total_tips,
+        "безнал_добавлено": total_beznal_add,
+        "всего": total_nal + total_card + total_tips,
+        "смен": len(shifts),
+        "накопленный_безнал": ledger.current_balance(),
+    }
+
+
+def get_month_shifts_details(year_month: str) -> pd.DataFrame:
+    conn = get_connection()
+    cur = conn.cursor()
+    rows = []
+    for shift_id, date_str, km, fuel_liters, fuel_price in _month_shifts(cur, year_month):
+        nal, card, tips, beznal = _shift_sums(cur, shift_id)
+        rows.append(
+            {
+                "Дата": date_str,
+                "Нал": nal,
+                "Карта": card,
+                "Чаевые": tips,
+                "Δ безнал": beznal,
+                "Км": km or 0,
+                "Литры": fuel_liters or 0.0,
+                "Цена": fuel_price or 0.0,
+                "Всего": nal + card + tips,
+            }
+        )
+    conn.close()
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df.index = list(range(1, len(df) + 1))
+    return df
+
+
+def get_orders_by_hour(date_str: str) -> pd.DataFrame:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT o.order_time
+        FROM orders o
+        JOIN shifts s ON o.shift_id = s.id
+        WHERE s.date = ?
+          AND s.is_open = 0
+          AND o.order_time IS NOT NULL
+        """,
+        (date_str,),
+    )
+    times = [r[0] for r in cur.fetchall()]
+    conn.close()
+
+    hours = []
+    for t in times:
+        try:
+            h = int(str(t)[0:2])
+            if 0 <= h <= 23:
+                hours.append(h)
+        except Exception:
+            continue
+
+    counts = pd.Series(hours, dtype="int64").value_counts()
+    return pd.DataFrame(
+        {"Час": list(range(24)), "Заказов": [int(counts.get(h, 0)) for h in range(24)]}
+    )
+
+
+def recalc_full_db():
+    """Построчный пересчёт всех заказов по тарифу на дату смены."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT o.id, o.pay_type, o.amount, o.tips, s.date "
+        "FROM orders o JOIN shifts s ON s.id = o.shift_id"
+    )
+    rows = cur.fetchall()
+
+    for order_id, pay_type, amount, tips, date_str in rows:
+        _, rate_nal, rate_card = tariffs.get_tariff(date_str)
+        commission, total, beznal_added = tariffs.calc_order(
+            pay_type, amount or 0, tips or 0, rate_nal, rate_card
+        )
+        cur.execute(
+            "UPDATE orders SET commission = ?, total = ?, beznal_added = ? WHERE id = ?",
+            (commission, total, beznal_added, order_id),
+        )
+    conn.commit()
+    conn.close()
+
+    with db.transaction() as conn:
+        total_beznal = conn.execute(
+            "SELECT COALESCE(SUM(beznal_added), 0) FROM orders"
+        ).fetchone()[0]
+        ledger.set_balance(conn, total_beznal, kind=ledger.KIND_RECALC)
+    return len(rows)
+
+
+def _safe_str(v, default=""):
+    if v is None or (isinstance(v, float) and pd.isna(v)):
+        return default
+    s = str(v).strip()
+    return s if s != "" else default
+
+
+def _safe_num(v, default=0.0):
+    if v is None or (isinstance(v, float) and pd.isna(v)):
+        return default
+    s = str(v).strip().replace(",", ".")
+    if s == "":
+        return default
+    try:
+        return float(s)
+    except ValueError:
+        return default
+
+
+def import_dataframe(df: pd.DataFrame) -> int:
+    """Импорт через iterrows(): поиск смены, INSERT и запись журнала на каждую строку."""
+    df.columns = [str(c).strip() for c in df.columns]
+    df["Сумма"] = df["Сумма"].replace(r"^\s*$", pd.NA, regex=True)
+    df_clean = df[df["Сумма"].notna()].copy()
+
+    imported = 0
+    conn = get_connection()
+    cur = conn.cursor()
+    for _, row in df_clean.iterrows():
+        amount_f = _safe_num(row.get("Сумма"), default=None)
+        date_str = _safe_str(row.get("Дата"))
+        if amount_f is None or not date_str:
+            continue
+
+        cur.execute("SELECT id FROM shifts WHERE date = ?", (date_str,))
+        s = cur.fetchone()
+        if s:
+            shift_id = s[0]
+        else:
+            cur.execute(
+                "INSERT INTO shifts (date, is_open, opened_at, closed_at) VALUES (?, 0, ?, ?)",
+                (date_str, date_str, date_str),
+            )
+            shift_id = cur.lastrowid
+
+        typ = _safe_str(row.get("Тип", "нал"), default="нал").lower()
+        pay_type = money.PAY_CARD if typ in ("безнал", "card", "карта") else money.PAY_NAL
+        amount = money.to_kopecks(amount_f)
+        tips = money.to_kopecks(_safe_num(row.get("Чаевые"), default=0.0))
+        _, rate_nal, rate_card = tariffs.get_tariff(date_str)
+        commission, total, beznal_added = tariffs.calc_order(
+            pay_type, amount, tips, rate_nal, rate_card
+        )
+        cur.execute(
+            """
+            INSERT INTO orders (shift_id, pay_type, amount, tips, commission, total, beznal_added, order_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (shift_id, pay_type, amount, tips, commission, total, beznal_added, None),
+        )
+        ledger.post(conn, ledger.KIND_IMPORT, beznal_added, order_id=cur.lastrowid)
+        imported += 1
+
+    conn.commit()
+    conn.close()
+    return imported
@@ -0,0 +1,314 @@
+"""
+Нагрузочный прогон: несколько сессий Streamlit против одной БД.
+
+Каждый пользователь — отдельный процесс со своими AppTest для app.py,
+Reports и Admin (как вкладки браузера с собственным session_state).
+Процессы, а не потоки: AppTest на время прогона подменяет глобальное
+состояние Streamlit (Runtime, secrets, config) и параллельно в одном
+процессе не работает. Для SQLite разницы нет — блокировки файловые. Пользователь в цикле
+выбирает действие по весам ACTION_WEIGHTS: добавить заказ в открытую
+смену, открыть отчёт за случайный месяц, импортировать небольшой CSV через
+поле Google Sheets или пересчитать базу. Время каждого прогона скрипта
+пишется в выборку действия; ошибки «database is locked» (исключения и
+st.error на странице) считаются отдельно.
+
+    python -m bench.load --users 8 --duration 60 --orders 20000
+
+База берётся из bench.run.dataset и копируется — исходный файл не меняется.
+AppTest перезапускает скрипт целиком, без частичных прогонов фрагментов,
+поэтому задержки здесь — верхняя оценка для браузера.
+"""
+
+import argparse
+import json
+import math
+import os
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import date, datetime
+
+from streamlit.testing.v1 import AppTest
+
+from bench import generate
+from bench.run import copy_db, dataset, metadata, use_db
+from taxi import db, reports, shifts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {
+    "app": os.path.join(ROOT, "app.py"),
+    "reports": os.path.join(ROOT, "pages", "Reports.py"),
+    "admin": os.path.join(ROOT, "pages", "Admin.py"),
+}
+ADMIN_PASSWORD = "load-test"
+
+ACTION_WEIGHTS = {"add_order": 10, "reports": 5, "import": 1, "recalc": 1}
+IMPORT_ROWS = 200
+LOCK_MARKERS = ("database is locked", "database table is locked")
+PERCENTILES = (50, 95, 99)
+MAX_MESSAGES = 20
+
+
+# ===== СЕССИИ =====
+def page(user: dict, name: str) -> AppTest:
+    """AppTest страницы name для пользователя (создаётся один раз, как вкладка)."""
+    at = user["pages"].get(name)
+    if at is None:
+        at = AppTest.from_file(SCRIPTS[name], default_timeout=user["timeout"])
+        at.secrets["ADMIN_PASSWORD"] = ADMIN_PASSWORD
+        user["pages"][name] = at
+    return at
+
+
+def page_errors(at: AppTest) -> list:
+    """Тексты исключений и st.error последнего прогона."""
+    return [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+
+
+def measure(stats: dict, action: str, at: AppTest, step):
+    """Выполняет step() (один прогон скрипта) и записывает время и исход."""
+    started = time.perf_counter()
+    try:
+        step()
+        errors = page_errors(at)
+    except RuntimeError as e:  # AppTest: скрипт не уложился в default_timeout
+        errors = [f"timeout: {e}"]
+    elapsed = time.perf_counter() - started
+
+    locked = any(m in text for text in errors for m in LOCK_MARKERS)
+    timed_out = any(text.startswith("timeout:") for text in errors)
+    failed = bool(at.exception) and not locked
+    row = stats["actions"].setdefault(
+        action, {"samples": [], "lock_errors": 0, "errors": 0, "timeouts": 0}
+    )
+    row["samples"].append(elapsed)
+    row["lock_errors"] += locked
+    row["errors"] += failed
+    row["timeouts"] += timed_out
+    if (locked or failed or timed_out) and len(stats["messages"]) < MAX_MESSAGES:
+        stats["messages"].append(f"{action}: {errors[0][:200]}")
+
+
+def ensure_loaded(user: dict, stats: dict, name: str) -> AppTest:
+    at = page(user, name)
+    if not user["loaded"].get(name):
+        measure(stats, f"open_{name}", at, at.run)
+        user["loaded"][name] = True
+    return at
+
+
+def admin(user: dict, stats: dict) -> AppTest:
+    """Страница Admin после входа (вход — один раз за сессию)."""
+    at = ensure_loaded(user, stats, "admin")
+    if not user["admin_ok"]:
+        at.text_input[0].input(ADMIN_PASSWORD)
+        measure(stats, "admin_login", at, at.button[0].click().run)
+        user["admin_ok"] = not at.exception
+    return at
+
+
+# ===== ДЕЙСТВИЯ =====
+def add_order(user: dict, stats: dict):
+    at = ensure_loaded(user, stats, "app")
+    rng = user["rng"]
+    amount = [n for n in at.number_input if n.label.startswith("Сумма")]
+    if not amount:  # открытой смены нет — просто перечитываем страницу
+        measure(stats, "add_order", at, at.run)
+        return
+    amount[0].set_value(float(rng.randrange(200, 1500, 50)))
+    at.selectbox[0].set_value(rng.choice(("нал", "карта")))
+    submit = [b for b in at.button if "Сохранить заказ" in b.label][0]
+    measure(stats, "add_order", at, submit.click().run)
+
+
+def open_report(user: dict, stats: dict):
+    at = ensure_loaded(user, stats, "reports")
+    if at.selectbox:
+        # варианты в дереве уже отформатированы — выбираем по исходному значению
+        month = user["rng"].choice(reports.available_months())
+        measure(stats, "reports", at, at.selectbox[0].set_value(month).run)
+    else:
+        measure(stats, "reports", at, at.run)
+
+
+def run_import(user: dict, stats: dict):
+    at = admin(user, stats)
+    if not user["admin_ok"]:
+        return
+    [t for t in at.text_input if "Google" in t.label][0].input(user["csv"])
+    button = [b for b in at.button if "Google" in b.label][0]
+    measure(stats, "import", at, button.click().run)
+
+
+def run_recalc(user: dict, stats: dict):
+    at = admin(user, stats)
+    if not user["admin_ok"]:
+        return
+    # подтверждение появляется только на следующем прогоне после нажатия,
+    # а после пересчёта страница остановлена на st.stop() без кнопок
+    if "recalc_yes" not in {b.key for b in at.button}:
+        if "btn_recalc" in {b.key for b in at.button}:
+            at.button(key="btn_recalc").click().run()
+        at.run()
+    measure(stats, "recalc", at, at.button(key="recalc_yes").click().run)
+
+
+ACTIONS = {
+    "add_order": add_order,
+    "reports": open_report,
+    "import": run_import,
+    "recalc": run_recalc,
+}
+
+
+def user_process(index: int, args, db_path: str, work_dir: str) -> dict:
+    """Сессия одного пользователя в отдельном процессе; возвращает его статистику."""
+    db.DB_NAME = db_path
+    rng = random.Random(args.seed * 1000 + index)
+    user = {
+        "rng": rng,
+        "pages": {},
+        "loaded": {},
+        "admin_ok": False,
+        "timeout": args.timeout,
+        "csv": generate.write_import_csv(
+            os.path.join(work_dir, f"import_{index}.csv"), IMPORT_ROWS, args.seed + index
+        ),
+    }
+    stats = {"actions": {}, "script_errors": 0, "messages": []}
+    names = list(ACTION_WEIGHTS)
+    weights = [ACTION_WEIGHTS[n] for n in names]
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        action = rng.choices(names, weights=weights)[0]
+        try:
+            ACTIONS[action](user, stats)
+        except Exception as e:  # сбой самого сценария (элемент не найден и т.п.)
+            stats["script_errors"] += 1
+            if len(stats["messages"]) < MAX_MESSAGES:
+                stats["messages"].append(f"{action}: {type(e).__name__}: {e}")
+        if args.think:
+            time.sleep(rng.uniform(0, args.think))
+    db.close_all_connections()
+    return stats
+
+
+def merge(parts: list) -> dict:
+    """Сводит статистику процессов в одну."""
+    total = {"actions": {}, "script_errors": 0, "messages": []}
+    for part in parts:
+        for action, row in part["actions"].items():
+            acc = total["actions"].setdefault(
+                action, {"samples": [], "lock_errors": 0, "errors": 0, "timeouts": 0}
+            )
+            acc["samples"].extend(row["samples"])
+            for field in ("lock_errors", "errors", "timeouts"):
+                acc[field] += row[field]
+        total["script_errors"] += part["script_errors"]
+        total["messages"].extend(part["messages"])
+    total["messages"] = total["messages"][:MAX_MESSAGES]
+    return total
+
+
+# ===== ОТЧЁТ =====
+def percentile(values: list, p: float) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(stats: dict) -> list:
+    rows = []
+    for action, row in sorted(stats["actions"].items()):
+        samples = row["samples"]
+        rows.append(
+            {
+                "action": action,
+                "runs": len(samples),
+                **{f"p{p}_s": percentile(samples, p) for p in PERCENTILES},
+                "max_s": max(samples),
+                "lock_errors": row["lock_errors"],
+                "errors": row["errors"],
+                "timeouts": row["timeouts"],
+            }
+        )
+    return rows
+
+
+def print_summary(rows: list):
+    print(f"{'действие':<14}{'прогонов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'макс, мс':>10}{'locked':>8}{'ошибок':>8}{'таймаут':>9}")
+    for r in rows:
+        print(
+            f"{r['action']:<14}{r['runs']:>9}"
+            + "".join(f"{r[f'p{p}_s'] * 1000:>10.0f}" for p in PERCENTILES)
+            + f"{r['max_s'] * 1000:>10.0f}{r['lock_errors']:>8}{r['errors']:>8}{r['timeouts']:>9}"
+        )
+
+
+# ===== ЗАПУСК =====
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон страниц Streamlit")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд")
+    parser.add_argument("--orders", type=int, default=10_000, help="размер синтетической БД")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--think", type=float, default=0.2, help="пауза между действиями, до N с")
+    parser.add_argument("--timeout", type=float, default=60.0, help="таймаут одного прогона, с")
+    parser.add_argument("--data-dir", default=os.path.join("bench", "data"))
+    parser.add_argument("--out", default=None, help="JSON с результатами")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    out = args.out or os.path.join(
+        "bench", "results", f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = copy_db(dataset(args.data_dir, args.orders, args.seed), work_dir)
+        use_db(db_path)
+        if shifts.get_open_shift() is None:
+            shifts.open_shift(date.today().isoformat())
+        db.close_all_connections()
+
+        print(f"== {args.users} пользователей, {args.duration:.0f} с, {args.orders} заказов")
+        # spawn: дочерний процесс не наследует состояние Streamlit и соединения
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(args.users) as pool:
+            parts = pool.starmap(
+                user_process,
+                [(i, args, db_path, work_dir) for i in range(args.users)],
+            )
+    stats = merge(parts)
+
+    rows = summarize(stats)
+    print_summary(rows)
+    if stats["script_errors"]:
+        print(f"Сбоев сценария: {stats['script_errors']}")
+    for msg in stats["messages"]:
+        print(f"  {msg}")
+
+    report = {
+        "meta": {
+            **metadata(),
+            "users": args.users,
+            "duration_s": args.duration,
+            "orders": args.orders,
+            "seed": args.seed,
+            "think_s": args.think,
+            "weights": ACTION_WEIGHTS,
+        },
+        "results": rows,
+        "script_errors": stats["script_errors"],
+        "messages": stats["messages"],
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()
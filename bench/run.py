@@ -0,0 +1,241 @@
+"""
+Замеры горячих путей: текущие функции taxi и исходные из bench.legacy.
+
+Для каждого размера генерируется (или берётся из --data-dir) синтетическая
+БД, на ней выполняются чтения, пересчёт и импорт. Результаты пишутся в JSON:
+метаданные прогона (коммит, версии Python/SQLite) и строка на каждую пару
+(размер, случай, реализация) с медианой и минимумом времени одного вызова.
+
+    python -m bench.run --sizes 1000 100000 --out bench/results/latest.json
+
+Пересчёт и импорт меняют БД, поэтому идут на копии файла. Исходные
+построчные реализации на больших объёмах работают минутами — для них
+есть потолки --legacy-max-orders и --import-max-rows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from bench import generate, legacy
+from taxi import dates, db, imports, reports, shifts, tariffs
+from taxi.migrations import migrate
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+READ_REPEATS = 7
+SAMPLE_SHIFTS = 50
+LEGACY_MAX_ORDERS = 200_000
+IMPORT_MAX_ROWS = 100_000
+
+
+# ===== ПОДГОТОВКА =====
+def use_db(path: str):
+    """Переключает taxi.db на файл path (соединения открываются заново)."""
+    db.close_all_connections()
+    db.DB_NAME = path
+    migrate()
+
+
+def dataset(data_dir: str, orders: int, seed: int) -> str:
+    path = os.path.join(data_dir, f"orders_{orders}_seed{seed}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        info = generate.generate_db(path, orders, seed)
+        print(
+            f"  сгенерировано: {info['orders']} заказов, {info['shifts']} смен "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+        db.close_all_connections()
+    return path
+
+
+def copy_db(path: str, target_dir: str) -> str:
+    """Копия файла БД (после checkpoint WAL) для случаев, которые пишут."""
+    db.close_all_connections()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    target = os.path.join(target_dir, "work.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    shutil.copyfile(path, target)
+    return target
+
+
+def empty_db(target_dir: str) -> str:
+    target = os.path.join(target_dir, "import.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    return target
+
+
+def sample(seed: int):
+    """Месяц, даты и id смен для чтения — одинаковые для обеих реализаций."""
+    conn = db.get_connection()
+    rng = random.Random(seed)
+    months = reports.available_months()
+    days = [d for (d,) in conn.execute("SELECT DISTINCT date FROM shifts ORDER BY date")]
+    ids = [i for (i,) in conn.execute("SELECT id FROM shifts")]
+    return {
+        "month": months[len(months) // 2],
+        "dates": rng.sample(days, min(len(days), SAMPLE_SHIFTS)),
+        "shift_ids": rng.sample(ids, min(len(ids), SAMPLE_SHIFTS)),
+    }
+
+
+# ===== СЛУЧАИ =====
+def _each(func, values):
+    def run():
+        for value in values:
+            func(value)
+    return run, len(values)
+
+
+def read_cases(s: dict):
+    """(случай, реализация, функция без аргументов, вызовов в функции)."""
+    month = s["month"]
+    month_ts = dates.month_range(month)
+    return [
+        ("shift_totals", "current", *_each(shifts.get_shift_totals, s["shift_ids"])),
+        ("shift_totals", "legacy", *_each(legacy.get_shift_totals, s["shift_ids"])),
+        ("month_totals", "current", lambda: reports.period_totals(*month_ts), 1),
+        ("month_totals", "legacy", lambda: legacy.get_month_totals(month), 1),
+        ("month_shifts_details", "current", lambda: reports.shift_metrics(*month_ts), 1),
+        ("month_shifts_details", "legacy", lambda: legacy.get_month_shifts_details(month), 1),
+        ("orders_by_hour", "current", *_each(reports.orders_by_hour, s["dates"])),
+        ("orders_by_hour", "legacy", *_each(legacy.get_orders_by_hour, s["dates"])),
+    ]
+
+
+def timed(func, repeats: int, calls: int = 1, warmup: bool = True) -> dict:
+    """Медиана и минимум времени одного вызова, секунды."""
+    if warmup:
+        func()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) / calls)
+    return {
+        "runs": repeats,
+        "calls": calls,
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+    }
+
+
+def bench_size(orders: int, args, work_dir: str) -> list:
+    results = []
+
+    def record(case, impl, stats, **extra):
+        row = {"orders": orders, "case": case, "impl": impl, **stats, **extra}
+        results.append(row)
+        print(
+            f"  {case:<22} {impl:<8} "
+            + (f"{row['median_s'] * 1000:10.3f} мс" if "median_s" in row else row.get("skipped", ""))
+        )
+
+    path = dataset(args.data_dir, orders, args.seed)
+    use_db(path)
+    s = sample(args.seed)
+    for case, impl, func, calls in read_cases(s):
+        record(case, impl, timed(func, args.repeats, calls))
+
+    legacy_ok = orders <= args.legacy_max_orders
+
+    # пересчёт всей базы — на копии, по одному прогону
+    use_db(copy_db(path, work_dir))
+    record("recalc_full_db", "current", timed(tariffs.recalc_all, 1, warmup=False))
+    if legacy_ok:
+        use_db(copy_db(path, work_dir))
+        record("recalc_full_db", "legacy", timed(legacy.recalc_full_db, 1, warmup=False))
+    else:
+        record("recalc_full_db", "legacy", {"skipped": f"> {args.legacy_max_orders} заказов"})
+
+    # импорт в пустую БД из файлов, сгенерированных тем же генератором
+    rows = min(orders, args.import_max_rows)
+    csv_path = generate.write_import_csv(os.path.join(work_dir, "import.csv"), rows, args.seed)
+    xlsx_path = generate.write_import_xlsx(os.path.join(work_dir, "import.xlsx"), rows, args.seed)
+    importers = [
+        ("import_csv", "current",
+         lambda: imports.import_orders_stream(imports.iter_csv_chunks(csv_path))),
+        ("import_csv", "legacy", lambda: legacy.import_dataframe(pd.read_csv(csv_path))),
+        ("import_xlsx", "current",
+         lambda: imports.import_orders_stream(imports.open_xlsx_chunks(xlsx_path)[0])),
+        ("import_xlsx", "legacy", lambda: legacy.import_dataframe(pd.read_excel(xlsx_path))),
+    ]
+    for case, impl, func in importers:
+        if impl == "legacy" and not legacy_ok:
+            record(case, impl, {"skipped": f"> {args.legacy_max_orders} заказов"}, rows=rows)
+            continue
+        use_db(empty_db(work_dir))
+        record(case, impl, timed(func, 1, warmup=False), rows=rows)
+    return results
+
+
+# ===== ЗАПУСК =====
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata() -> dict:
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки taxi.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=READ_REPEATS)
+    parser.add_argument("--data-dir", default=os.path.join("bench", "data"))
+    parser.add_argument("--out", default=None, help="JSON с результатами")
+    parser.add_argument("--legacy-max-orders", type=int, default=LEGACY_MAX_ORDERS)
+    parser.add_argument("--import-max-rows", type=int, default=IMPORT_MAX_ROWS)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    out = args.out or os.path.join(
+        "bench", "results", f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    report = {"meta": metadata(), "results": []}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for orders in args.sizes:
+            print(f"== {orders} заказов")
+            report["results"].extend(bench_size(orders, args, work_dir))
+            db.close_all_connections()
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Холодный старт страниц: время до первой отрисовки в свежем процессе.
+
+Каждый замер — новый интерпретатор (как после сна контейнера): импорт
+Streamlit, затем первый прогон страницы через AppTest и второй, тёплый.
+Первая отрисовка — момент, когда скрипт отправил первый элемент страницы
+(первое сообщение delta); до него пользователь видит пустой экран.
+
+    python -m bench.startup --repeats 5 --orders 10000
+
+Страницы идут против копии синтетической БД из bench.run.dataset.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    "app": "app.py",
+    "reports": os.path.join("pages", "Reports.py"),
+    "admin": os.path.join("pages", "Admin.py"),
+}
+METRICS = ("boot_s", "first_paint_s", "first_run_s", "warm_run_s", "modules")
+
+
+# ===== ДОЧЕРНИЙ ПРОЦЕСС =====
+def child(page: str):
+    """Один холодный замер страницы; печатает JSON со временами."""
+    started = time.perf_counter()
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+    from streamlit.testing.v1 import AppTest
+
+    booted = time.perf_counter()
+    first_delta = []
+    enqueue = ScriptRunContext.enqueue
+
+    def enqueue_timed(self, msg):
+        if not first_delta and msg.WhichOneof("type") == "delta":
+            first_delta.append(time.perf_counter())
+        return enqueue(self, msg)
+
+    ScriptRunContext.enqueue = enqueue_timed
+
+    at = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=120)
+    at.secrets["ADMIN_PASSWORD"] = "startup"
+    run_started = time.perf_counter()
+    at.run()
+    run_done = time.perf_counter()
+    if at.exception:
+        raise SystemExit(f"{page}: {at.exception[0].value}")
+    at.run()
+    warm_done = time.perf_counter()
+
+    print(json.dumps({
+        "boot_s": booted - started,
+        "first_paint_s": first_delta[0] - run_started if first_delta else None,
+        "first_run_s": run_done - run_started,
+        "warm_run_s": warm_done - run_done,
+        "modules": len(sys.modules),
+    }))
+
+
+# ===== ЗАПУСК =====
+def measure(page: str, db_path: str) -> dict:
+    env = {**os.environ, "TAXI_DB": db_path}
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", page],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Холодный старт страниц")
+    parser.add_argument("--child", choices=PAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--pages", nargs="+", choices=PAGES, default=list(PAGES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--orders", type=int, default=10_000, help="размер синтетической БД")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join("bench", "data"))
+    parser.add_argument("--out", default=None, help="JSON с результатами")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from bench.run import copy_db, dataset, metadata, use_db
+    from taxi import db
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    out = args.out or os.path.join(
+        "bench", "results", f"startup-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = copy_db(dataset(args.data_dir, args.orders, args.seed), work_dir)
+        use_db(db_path)
+        db.close_all_connections()
+
+        print(f"{'страница':<10}" + "".join(f"{m:>15}" for m in METRICS))
+        for page in args.pages:
+            samples = [measure(page, db_path) for _ in range(args.repeats)]
+            row = {"page": page, "runs": len(samples)}
+            for m in METRICS:
+                values = [s[m] for s in samples if s[m] is not None]
+                row[m] = statistics.median(values) if values else None
+            results.append(row)
+            print(
+                f"{page:<10}"
+                + "".join(
+                    f"{row[m]:>15}" if m == "modules" else f"{row[m] * 1000:>12.0f} мс"
+                    for m in METRICS
+                )
+            )
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata(), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,28 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
-import pandas as pd
-import os
+import itertools
 
+from taxi import db, instrument, ledger
+from taxi.migrations import ensure_schema, reset_database
+from taxi.money import fmt_amount, fmt_rub, to_kopecks, to_rub
+from taxi.summary import verify_shift_summary
+from taxi.tariffs import (
+    DEFAULT_RATE_CARD,
+    DEFAULT_RATE_NAL,
+    MIN_DATE,
+    list_tariffs,
+    recalc_all,
+    set_tariff,
+)
 
-DB_NAME = "taxi.db"
-rate_nal = 0.78
-rate_card = 0.75
+
+MAX_SHOWN_IMPORT_ERRORS = 20
 
 
 # ===== ПРОСТАЯ АВТОРИЗАЦИЯ ДЛЯ АДМИНКИ =====
 
-ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD", "changeme")
+def admin_password() -> str:
+    """Пароль из secrets читается только при попытке входа, не на каждом прогоне."""
+    return st.secrets.get("ADMIN_PASSWORD", "changeme")
 
 
 def check_admin_auth() -> bool:
@@ -30,7 +40,7 @@ def check_admin_auth() -> bool:
         ok = st.form_submit_button("Войти")
 
     if ok:
-        if pwd == ADMIN_PASSWORD:
+        if pwd == admin_password():
             st.session_state.admin_authenticated = True
             st.success("Доступ к администрированию открыт.")
             return True
@@ -40,422 +50,138 @@ def check_admin_auth() -> bool:
     return False
 
 
-# ===== БАЗА / ХЕЛПЕРЫ =====
-
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-
-def safe_str_cell(v, default=""):
-    """Строка из ячейки: пустые/NaN -> default."""
-    if v is None or (isinstance(v, float) and pd.isna(v)):
-        return default
-    s = str(v).strip()
-    return s if s != "" else default
-
-
-def safe_num_cell(v, default=0.0):
-    """Число из ячейки: пустые/NaN/мусор -> default."""
-    if v is None or (isinstance(v, float) and pd.isna(v)):
-        return default
-    s = str(v).strip().replace(",", ".")
-    if s == "":
-        return default
-    try:
-        return float(s)
-    except ValueError:
-        return default
-
-
-def get_accumulated_beznal():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT total_amount FROM accumulated_beznal WHERE driver_id = 1")
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else 0.0
-
+# ===== ИМПОРТ =====
+def show_import_errors(errors: list, total: int) -> int:
+    """Показывает первые ошибки импорта, возвращает их общее число."""
+    for msg in errors[:MAX_SHOWN_IMPORT_ERRORS]:
+        st.warning(f"❌ {msg}")
+    hidden = total - min(len(errors), MAX_SHOWN_IMPORT_ERRORS)
+    if hidden > 0:
+        st.warning(f"… и ещё строк с ошибками: {hidden}")
+    return total
+
+
+def run_stream_import(
+    chunks,
+    source_label: str,
+    fraction=None,
+    source_key: str | None = None,
+    source_name: str = "",
+    resume: bool = True,
+) -> int:
+    """
+    Общая часть импорта: проверка первой порции, импорт порциями с
+    прогрессом, вывод итога. fraction(stats) -> доля выполнения 0..1.
+    """
+    first = next(chunks, None)
+    if first is None:
+        st.error(f"❌ {source_label}: нет данных.")
+        return 0
 
-def recalc_full_db():
-    conn = get_connection()
-    cur = conn.cursor()
+    st.write("📋 Найдены колонки:", first.columns.tolist())
+    if "Сумма" not in first.columns:
+        st.error(f"❌ {source_label}: нет колонки 'Сумма'.")
+        return 0
+    from taxi.imports import drop_empty_amounts, import_orders_stream
 
-    cur.execute("SELECT id, type, amount, tips FROM orders")
-    rows = cur.fetchall()
+    st.write("Первые 5 строк:", drop_empty_amounts(first).head())
 
-    for order_id, typ, amount, tips in rows:
-        amount_f = float(amount or 0)
-        tips_f = float(tips or 0)
+    bar = st.progress(0.0, text="Импортируем данные...")
 
-        if typ == "нал":
-            final_wo_tips = amount_f
-            commission = amount_f * (1 - rate_nal)
-            total = amount_f + tips_f
-            beznal_added = -commission
-        else:
-            final_wo_tips = amount_f * rate_card
-            commission = amount_f - final_wo_tips
-            total = final_wo_tips + tips_f
-            beznal_added = final_wo_tips
-
-        cur.execute(
-            """
-            UPDATE orders
-            SET commission = ?, total = ?, beznal_added = ?
-            WHERE id = ?
-            """,
-            (commission, total, beznal_added, order_id),
+    def on_progress(stats):
+        done = min(fraction(stats), 1.0) if fraction else 0.0
+        bar.progress(
+            done,
+            text=(
+                f"Обработано строк: {stats['rows_done']}, "
+                f"импортировано заказов: {stats['imported']}"
+            ),
         )
 
-    cur.execute("SELECT COALESCE(SUM(beznal_added), 0) FROM orders")
-    total_beznal = cur.fetchone()[0] or 0.0
-
-    cur.execute("SELECT id FROM accumulated_beznal WHERE driver_id = 1")
-    row = cur.fetchone()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    if row:
-        cur.execute(
-            """
-            UPDATE accumulated_beznal
-            SET total_amount = ?, last_updated = ?
-            WHERE driver_id = 1
-            """,
-            (total_beznal, now),
-        )
-    else:
-        cur.execute(
-            """
-            INSERT INTO accumulated_beznal (driver_id, total_amount, last_updated)
-            VALUES (1, ?, ?)
-            """,
-            (total_beznal, now),
-        )
+    stats = import_orders_stream(
+        itertools.chain([first], chunks),
+        source_key=source_key,
+        source_name=source_name,
+        resume=resume,
+        progress=on_progress,
+    )
+    bar.progress(1.0, text=f"Обработано строк: {stats['rows_done']}")
 
-    conn.commit()
-    conn.close()
+    if stats["resumed_from"]:
+        st.info(f"Импорт продолжен со строки {stats['resumed_from'] + 1}.")
+    imported = stats["imported"]
+    errors = show_import_errors(stats["errors"], stats["error_count"])
 
+    if imported > 0:
+        st.success(f"✅ {source_label}: импортировано {imported} заказов")
+        if errors > 0:
+            st.warning(f"⚠️ Ошибок при импорте: {errors}")
+    elif errors == 0 and not stats["resumed_from"]:
+        st.error(f"❌ {source_label}: нет строк с суммой!")
+    return imported
 
-def import_from_excel(uploaded_file) -> int:
-    """
-    Импорт из Excel/CSV.
 
-    Строка без суммы или без даты не создаёт смену.
+def import_from_excel(uploaded_file, source_key: str | None = None, resume: bool = True) -> int:
     """
-    try:
-        if uploaded_file.name.lower().endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-
-        df.columns = [str(c).strip() for c in df.columns]
-        st.write("📋 Найдены колонки:", df.columns.tolist())
-
-        if "Сумма" not in df.columns:
-            st.error("❌ В файле нет колонки 'Сумма'.")
-            return 0
-
-        df["Сумма"] = df["Сумма"].replace(r"^\s*$", pd.NA, regex=True)
-        df_clean = df[df["Сумма"].notna()].copy()
-
-        st.write(f"📊 Найдено строк с данными (Сумма не пустая): {len(df_clean)}")
-        st.write("Первые 5 строк:", df_clean.head())
-
-        if len(df_clean) == 0:
-            st.error("❌ В файле нет строк с суммой!")
-            return 0
-
-        imported = 0
-        errors = 0
-        conn = get_connection()
-        cur = conn.cursor()
-
-        for idx, row in df_clean.iterrows():
-            try:
-                # 1) СУММА
-                raw_amount = row.get("Сумма")
-                amount_f = safe_num_cell(raw_amount, default=None)
-                if amount_f is None:
-                    st.warning(
-                        f"❌ Строка {idx}: пустая или некорректная сумма ({raw_amount!r}), пропускаю."
-                    )
-                    errors += 1
-                    continue
-
-                # 2) ДАТА
-                raw_date = row.get("Дата")
-                date_str = safe_str_cell(raw_date)
-                if not date_str:
-                    st.warning(
-                        f"❌ Строка {idx}: пустая дата при сумме {amount_f}, пропускаю."
-                    )
-                    errors += 1
-                    continue
-
-                # 3) СМЕНА
-                cur.execute("SELECT id FROM shifts WHERE date = ?", (date_str,))
-                s = cur.fetchone()
-                if s:
-                    shift_id = s[0]
-                else:
-                    cur.execute(
-                        "INSERT INTO shifts (date, is_open, opened_at, closed_at) "
-                        "VALUES (?, 0, ?, ?)",
-                        (date_str, date_str, date_str),
-                    )
-                    shift_id = cur.lastrowid
-
-                # 4) ТИП ОПЛАТЫ
-                raw_type = row.get("Тип", "нал")
-                raw_type_str = safe_str_cell(raw_type, default="нал").lower()
-                if raw_type_str in ("безнал", "card", "карта"):
-                    typ = "карта"
-                else:
-                    typ = "нал"
-
-                # 5) ЧАЕВЫЕ
-                raw_tips = row.get("Чаевые")
-                tips_f = safe_num_cell(raw_tips, default=0.0)
-
-                # 6) Расчёты
-                if typ == "нал":
-                    final_wo_tips = amount_f
-                    commission = amount_f * (1 - rate_nal)
-                    total = amount_f + tips_f
-                    beznal_added = -commission
-                else:
-                    final_wo_tips = amount_f * rate_card
-                    commission = amount_f - final_wo_tips
-                    total = final_wo_tips + tips_f
-                    beznal_added = final_wo_tips
-
-                cur.execute(
-                    """
-                    INSERT INTO orders (shift_id, type, amount, tips, commission, total, beznal_added, order_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        shift_id,
-                        typ,
-                        amount_f,
-                        tips_f,
-                        commission,
-                        total,
-                        beznal_added,
-                        None,
-                    ),
-                )
-
-                if beznal_added != 0:
-                    cur.execute(
-                        """
-                        UPDATE accumulated_beznal
-                        SET total_amount = total_amount + ?
-                        WHERE driver_id = 1
-                        """,
-                        (beznal_added,),
-                    )
-
-                imported += 1
-
-            except Exception as e:
-                st.warning(f"⚠️ Строка {idx}: {e}")
-                errors += 1
-                continue
-
-        conn.commit()
-        conn.close()
+    Импорт из Excel/CSV порциями.
 
-        if imported > 0:
-            st.success(f"✅ Импортировано: {imported} заказов")
-            if errors > 0:
-                st.warning(f"⚠️ Ошибок при импорте: {errors}")
-        return imported
+    Строка без суммы или без даты не создаёт смену. Если передан
+    source_key (отпечаток файла), прерванный импорт продолжается
+    с последней закоммиченной порции.
+    """
+    from taxi.imports import open_file_chunks
 
+    try:
+        chunks, fraction = open_file_chunks(
+            uploaded_file, uploaded_file.name, uploaded_file.size
+        )
+        return run_stream_import(
+            chunks,
+            "Файл",
+            fraction=fraction,
+            source_key=source_key,
+            source_name=uploaded_file.name,
+            resume=resume,
+        )
     except Exception as e:
         st.error(f"❌ Ошибка чтения файла: {e}")
         return 0
 
 
-def reset_db():
-    if os.path.exists(DB_NAME):
-        os.remove(DB_NAME)
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS shifts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            km INTEGER DEFAULT 0,
-            fuel_liters REAL DEFAULT 0,
-            fuel_price REAL DEFAULT 0,
-            is_open INTEGER DEFAULT 1,
-            opened_at TEXT,
-            closed_at TEXT
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            shift_id INTEGER,
-            type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            tips REAL DEFAULT 0,
-            commission REAL NOT NULL,
-            total REAL NOT NULL,
-            beznal_added REAL DEFAULT 0,
-            order_time TEXT
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS accumulated_beznal (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            driver_id INTEGER DEFAULT 1,
-            total_amount REAL DEFAULT 0,
-            last_updated TEXT
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
-
 def import_from_gsheet(sheet_url: str) -> int:
     """
     Импортирует заказы из Google Sheets.
 
     Пустые даты или строки без суммы не создают смену.
     """
+    from taxi.imports import gsheet_csv_url, iter_csv_chunks
+
     try:
-        base_url = sheet_url.split("#")[0]
-        csv_url = base_url.replace("/edit?gid=", "/export?format=csv&gid=")
-        df = pd.read_csv(csv_url)
+        chunks = iter_csv_chunks(gsheet_csv_url(sheet_url))
+        return run_stream_import(chunks, "Google Sheets")
     except Exception as e:
         st.error(f"❌ Не удалось прочитать данные из Google Sheets: {e}")
         return 0
 
-    df.columns = [str(c).strip() for c in df.columns]
-    st.write("📋 Найдены колонки в Google Sheets:", df.columns.tolist())
-
-    if "Сумма" not in df.columns:
-        st.error("❌ В таблице нет колонки 'Сумма'.")
-        return 0
-
-    df["Сумма"] = df["Сумма"].replace(r"^\s*$", pd.NA, regex=True)
-    df_clean = df[df["Сумма"].notna()].copy()
-
-    st.write(f"📊 Найдено строк с данными (Сумма не пустая): {len(df_clean)}")
-    st.write("Первые 5 строк:", df_clean.head())
-
-    if len(df_clean) == 0:
-        st.error("❌ В таблице нет строк с суммой!")
-        return 0
-
-    imported = 0
-    errors = 0
-    conn = get_connection()
-    cur = conn.cursor()
-
-    for idx, row in df_clean.iterrows():
-        try:
-            raw_amount = row.get("Сумма")
-            amount_f = safe_num_cell(raw_amount, default=None)
-            if amount_f is None:
-                st.warning(
-                    f"❌ Строка {idx}: пустая или некорректная сумма ({raw_amount!r}), пропускаю."
-                )
-                errors += 1
-                continue
-
-            raw_date = row.get("Дата")
-            date_str = safe_str_cell(raw_date)
-            if not date_str:
-                st.warning(
-                    f"❌ Строка {idx}: пустая дата при сумме {amount_f}, пропускаю."
-                )
-                errors += 1
-                continue
 
-            cur.execute("SELECT id FROM shifts WHERE date = ?", (date_str,))
-            s = cur.fetchone()
-            if s:
-                shift_id = s[0]
-            else:
-                cur.execute(
-                    "INSERT INTO shifts (date, is_open, opened_at, closed_at) "
-                    "VALUES (?, 0, ?, ?)",
-                    (date_str, date_str, date_str),
-                )
-                shift_id = cur.lastrowid
+def uploaded_import_job(uploaded_file) -> tuple:
+    """Отпечаток загруженного файла и его прошлый импорт (или None)."""
+    from taxi.imports import file_fingerprint, get_import_job
 
-            raw_type = row.get("Тип", "нал")
-            raw_type_str = safe_str_cell(raw_type, default="нал").lower()
-            if raw_type_str in ("безнал", "card", "карта"):
-                typ = "карта"
-            else:
-                typ = "нал"
+    # отпечаток считаем один раз на загруженный файл, а не на каждый rerun
+    if st.session_state.get("import_file_id") != uploaded_file.file_id:
+        st.session_state.import_file_id = uploaded_file.file_id
+        st.session_state.import_file_key = file_fingerprint(uploaded_file)
+    file_key = st.session_state.import_file_key
+    return file_key, get_import_job(file_key)
 
-            raw_tips = row.get("Чаевые")
-            tips_f = safe_num_cell(raw_tips, default=0.0)
 
-            if typ == "нал":
-                final_wo_tips = amount_f
-                commission = amount_f * (1 - rate_nal)
-                total = amount_f + tips_f
-                beznal_added = -commission
-            else:
-                final_wo_tips = amount_f * rate_card
-                commission = amount_f - final_wo_tips
-                total = final_wo_tips + tips_f
-                beznal_added = final_wo_tips
-
-            cur.execute(
-                """
-                INSERT INTO orders (shift_id, type, amount, tips, commission, total, beznal_added, order_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    shift_id,
-                    typ,
-                    amount_f,
-                    tips_f,
-                    commission,
-                    total,
-                    beznal_added,
-                    None,
-                ),
-            )
-
-            if beznal_added != 0:
-                cur.execute(
-                    """
-                    UPDATE accumulated_beznal
-                    SET total_amount = total_amount + ?
-                    WHERE driver_id = 1
-                    """,
-                    (beznal_added,),
-                )
-
-            imported += 1
+# ===== ТАБЛИЦЫ =====
+def table(rows, columns=None):
+    """DataFrame для st.dataframe; pandas грузится только после входа."""
+    import pandas as pd
 
-        except Exception as e:
-            st.warning(f"⚠️ Строка {idx}: {e}")
-            errors += 1
-            continue
-
-    conn.commit()
-    conn.close()
-
-    if imported > 0:
-        st.success(f"✅ Импортировано из Google Sheets: {imported} заказов")
-        if errors > 0:
-            st.warning(f"⚠️ Ошибок при импорте: {errors}")
-    return imported
+    return pd.DataFrame(rows, columns=columns)
 
 
 # ===== UI / ЗАПУСК СТРАНИЦЫ =====
@@ -463,9 +189,12 @@ def import_from_gsheet(sheet_url: str) -> int:
 st.set_page_config(page_title="Администрирование", page_icon="🛠", layout="centered")
 st.title("🛠 Администрирование")
 
+# до входа страница — только форма пароля: без схемы БД и тяжёлых импортов
 if not check_admin_auth():
     st.stop()
 
+ensure_schema()
+
 # 0. Импорт из Google Sheets
 with st.expander("📄 Заливка базы из Google Sheets", expanded=False):
     st.caption(
@@ -477,8 +206,7 @@ with st.expander("📄 Заливка базы из Google Sheets", expanded=Fal
     sheet_url = st.text_input("Ссылка на Google Sheets", value=default_url)
 
     if st.button("Импортировать из Google Sheets", width="stretch"):
-        with st.spinner("Читаем данные из Google Sheets..."):
-            count = import_from_gsheet(sheet_url)
+        count = import_from_gsheet(sheet_url)
         if count <= 0:
             st.warning("Не удалось импортировать из Google Sheets. Проверь ссылку и формат колонок.")
 
@@ -490,51 +218,108 @@ with st.expander("📥 Импорт из файла 'Работа такси' (E
 
     uploaded = st.file_uploader("Выберите файл", type=["xlsx", "xls", "csv"])
     if uploaded is not None:
+        file_key, job = uploaded_import_job(uploaded)
+        resume = True
+        if job and job[3]:
+            st.info(f"Этот файл уже импортирован ({job[1]} заказов, {job[3]}).")
+            resume = not st.checkbox("Импортировать повторно", key="import_again")
+        elif job:
+            st.info(
+                f"Импорт этого файла был прерван после строки {job[0]} "
+                f"(импортировано {job[1]} заказов) — он будет продолжен."
+            )
+            resume = not st.checkbox("Начать заново", key="import_restart")
+
         if st.button("Импортировать", width="stretch"):
-            with st.spinner("Импортируем данные..."):
-                count = import_from_excel(uploaded)
+            count = import_from_excel(uploaded, source_key=file_key, resume=resume)
             if count > 0:
                 st.success(f"✓ Импортировано заказов: {count}")
-                acc = get_accumulated_beznal()
-                st.info(f"Текущий накопленный безнал: {acc:.2f} ₽")
+                acc = ledger.current_balance()
+                st.info(f"Текущий накопленный безнал: {fmt_rub(acc, 2)}")
             else:
-                st.warning("Не удалось импортировать данные. Проверьте формат файла.")
+                st.warning("Новых заказов не импортировано. Проверьте формат файла.")
 
 # 2. Ручная корректировка безнала
 with st.expander("🔧 Ручная корректировка накопленного безнала", expanded=False):
-    current_acc = get_accumulated_beznal()
-    st.write(f"Текущее значение: {current_acc:.2f} ₽")
+    current_acc = ledger.current_balance()
+    st.write(f"Текущее значение: {fmt_rub(current_acc, 2)}")
 
     new_value = st.number_input(
         "Новое значение, ₽",
         min_value=0.0,
-        value=float(current_acc),
+        value=to_rub(current_acc),
         step=100.0,
         format="%.2f",
         key="manual_beznal",
     )
 
     if st.button("💾 Установить", width="stretch", key="btn_set_beznal"):
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            UPDATE accumulated_beznal
-            SET total_amount = ?, last_updated = ?
-            WHERE driver_id = 1
-            """,
-            (new_value, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-        )
-        conn.commit()
-        conn.close()
+        ledger.correct_balance(to_kopecks(new_value), note="ручная корректировка")
         st.success(f"Накопленный безнал обновлён до {new_value:.2f} ₽")
         st.rerun()
 
-# 3. Пересчёт базы
+    st.markdown("**Журнал безнала**")
+    moment = st.date_input("Баланс на дату", key="ledger_moment")
+    balance = ledger.balance_at(moment.strftime("%Y-%m-%d"))
+    st.write(f"На конец {moment:%d.%m.%Y}: {fmt_rub(balance, 2)}")
+    entries = ledger.last_entries()
+    if entries:
+        st.dataframe(
+            table(
+                entries, columns=["id", "Время", "Вид", "Сумма", "Заказ", "Примечание"]
+            ).style.format({"Сумма": lambda k: fmt_amount(k, 2)}),
+            width="stretch",
+            hide_index=True,
+        )
+
+# 3. Тарифы
+with st.expander("💱 Тарифы", expanded=False):
+    st.caption(
+        "Тариф действует с указанной даты смены до начала следующей версии. "
+        "При изменении пересчитываются только заказы из этого окна дат."
+    )
+    st.dataframe(
+        table(
+            [
+                {
+                    "С": "—" if valid_from == MIN_DATE else valid_from,
+                    "По": valid_to or "—",
+                    "Нал, доля водителя": rate_nal,
+                    "Карта, доля водителя": rate_card,
+                }
+                for _, valid_from, valid_to, rate_nal, rate_card in list_tariffs()
+            ]
+        ),
+        hide_index=True,
+        width="stretch",
+    )
+
+    with st.form("new_tariff"):
+        tariff_from = st.date_input("Действует с даты смены")
+        c1, c2 = st.columns(2)
+        with c1:
+            tariff_nal = st.number_input(
+                "Нал", min_value=0.0, max_value=1.0, value=DEFAULT_RATE_NAL, step=0.01
+            )
+        with c2:
+            tariff_card = st.number_input(
+                "Карта", min_value=0.0, max_value=1.0, value=DEFAULT_RATE_CARD, step=0.01
+            )
+        submitted_tariff = st.form_submit_button("💾 Применить тариф")
+
+    if submitted_tariff:
+        res = set_tariff(tariff_nal, tariff_card, tariff_from.strftime("%Y-%m-%d"))
+        st.success(
+            f"Тариф применён с {res['valid_from']} по {res['valid_to'] or '—'}. "
+            f"Пересчитано заказов: {res['rows']} за {res['seconds']:.3f} с, "
+            f"изменение безнала: {fmt_rub(res['beznal_delta'], 2)}"
+        )
+
+# 4. Пересчёт базы
 with st.expander("🔁 Пересчитать базу", expanded=False):
     st.caption(
         "Пересчитывает commission, total и beznal_added по всем заказам "
-        "и заново собирает накопленный безнал по текущей логике."
+        "по действующим тарифам и заново собирает накопленный безнал."
     )
 
     if "confirm_recalc_db" not in st.session_state:
@@ -548,18 +333,100 @@ with st.expander("🔁 Пересчитать базу", expanded=False):
         c1, c2 = st.columns(2)
         with c1:
             if st.button("Да", width="stretch", key="recalc_yes"):
-                recalc_full_db()
-                new_acc = get_accumulated_beznal()
+                stats = recalc_all()
+                new_acc = ledger.current_balance()
                 st.session_state.confirm_recalc_db = False
                 st.success(
-                    f"Готово! База пересчитана. Новый накопленный безнал: {new_acc:.2f} ₽"
+                    f"Готово! База пересчитана. Новый накопленный безнал: {fmt_rub(new_acc, 2)}"
+                )
+                st.caption(
+                    f"Заказов: {stats['rows']}, время: {stats['seconds']:.3f} с, "
+                    f"скорость: {stats['rows_per_sec']:.0f} строк/с"
                 )
                 st.stop()
         with c2:
             if st.button("Отмена", width="stretch", key="recalc_no"):
                 st.session_state.confirm_recalc_db = False
 
-# 4. Обнуление базы
+# 5. Проверка сводки по сменам
+with st.expander("🧮 Сводка по сменам", expanded=False):
+    st.caption(
+        "Итоги смен ведутся триггерами в таблице shift_summary. "
+        "Проверка пересобирает их по заказам и сравнивает с хранимыми."
+    )
+    rebuild = st.checkbox("Исправить расхождения", value=False, key="summary_rebuild")
+    if st.button("Проверить сводку", width="stretch", key="btn_verify_summary"):
+        res = verify_shift_summary(rebuild=rebuild)
+        if not res["mismatches"]:
+            st.success(f"Смен проверено: {res['checked']}, расхождений нет.")
+        else:
+            st.warning(f"Смен проверено: {res['checked']}, расхождений: {len(res['mismatches'])}.")
+            st.dataframe(
+                table(
+                    res["mismatches"][:MAX_SHOWN_IMPORT_ERRORS],
+                    columns=["Смена", "Поле", "Хранится", "По заказам"],
+                ).astype(str),
+                width="stretch",
+            )
+            if res["rebuilt"]:
+                st.success("Сводка пересобрана.")
+
+# 6. Диагностика производительности
+with st.expander("⏱ Диагностика", expanded=False):
+    st.caption(
+        "Время секций страниц и SQL-запросов. Сбор включается здесь или "
+        "переменной окружения TAXI_INSTRUMENT=1 и немного замедляет работу."
+    )
+    collect = st.toggle("Собирать статистику", value=instrument.enabled())
+    if collect != instrument.enabled():
+        instrument.set_enabled(collect)
+    if st.button("Сбросить статистику", width="stretch", key="btn_instrument_reset"):
+        instrument.reset()
+
+    diag = instrument.snapshot(db.DB_NAME)
+    st.write(f"Операторов выполнено SQLite (с триггерами): {diag['traced']}")
+
+    st.markdown("**Секции страниц**")
+    if diag["sections"]:
+        st.dataframe(
+            table(
+                [
+                    (name, calls, total * 1000, peak * 1000, last * 1000)
+                    for name, calls, total, peak, last in diag["sections"]
+                ],
+                columns=["Секция", "Вызовов", "Всего, мс", "Макс, мс", "Последний, мс"],
+            ).style.format(precision=1),
+            width="stretch",
+            hide_index=True,
+        )
+    else:
+        st.write("Нет данных.")
+
+    st.markdown("**Запросы**")
+    if diag["statements"]:
+        st.dataframe(
+            table(
+                [
+                    (sql, calls, total * 1000, total * 1000 / calls if calls else 0.0,
+                     peak * 1000, vm_steps)
+                    for sql, calls, total, peak, vm_steps in diag["statements"]
+                ],
+                columns=["Запрос", "Вызовов", "Всего, мс", "Среднее, мс", "Макс, мс", "Шаги VM"],
+            ).style.format(precision=2),
+            width="stretch",
+            hide_index=True,
+        )
+    else:
+        st.write("Нет данных.")
+
+    st.markdown(f"**Медленные запросы (от {instrument.SLOW_MS:.0f} мс)**")
+    if not diag["slow"]:
+        st.write("Нет.")
+    for entry in diag["slow"][:MAX_SHOWN_IMPORT_ERRORS]:
+        st.write(f"{entry['at']} · {entry['ms']:.1f} мс")
+        st.code(entry["sql"] + "\n\n-- план:\n" + "\n".join(entry["plan"]), language="sql")
+
+# 7. Обнуление базы
 with st.expander("⚠ Обнуление базы данных", expanded=False):
     st.caption(
         "Удаляет все смены, заказы и накопленный безнал. "
@@ -577,7 +444,7 @@ with st.expander("⚠ Обнуление базы данных", expanded=False)
         r1, r2 = st.columns(2)
         with r1:
             if st.button("Да, удалить", width="stretch", key="reset_yes"):
-                reset_db()
+                reset_database()
                 st.session_state.confirm_reset = False
                 st.success("База очищена. Можно начинать заново.")
                 st.stop()
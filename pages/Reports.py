@@ -1,226 +1,126 @@
-import streamlit as st
-import sqlite3
-import pandas as pd
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-DB_NAME = "taxi.db"
+import streamlit as st
 
+from taxi import cube, export, instrument, ledger, reports
+from taxi.cache import cached
+from taxi.dates import DAY, date_to_epoch, month_range
+from taxi.migrations import ensure_schema
+from taxi.money import KOPECKS, PAY_CARD, PAY_NAL, fmt_amount, fmt_rub
+from taxi.shifts import get_closed_shift_id, get_shift_orders
 
-# ===== Работа с БД =====
-def get_connection():
-    return sqlite3.connect(DB_NAME)
+if TYPE_CHECKING:
+    import pandas as pd
 
 
+# ===== Работа с БД =====
+@cached()
 def get_available_year_months():
     """
     Месяцы только по закрытым сменам, у которых есть хотя бы один заказ.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT DISTINCT strftime('%Y-%m', date)
-        FROM shifts
-        WHERE date IS NOT NULL
-          AND TRIM(date) <> ''
-          AND is_open = 0
-          AND EXISTS (SELECT 1 FROM orders o WHERE o.shift_id = shifts.id)
-        ORDER BY 1 DESC
-        """
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    res = []
-    for (val,) in rows:
-        if val is None:
-            continue
-        s = str(val)
-        if len(s) >= 7 and s[0:4].isdigit() and s[5:7].isdigit():
-            res.append(s)
-    return res
-
-
-def get_current_accumulated_beznal() -> float:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT total_amount FROM accumulated_beznal WHERE driver_id = 1"
-    )
-    row = cur.fetchone()
-    conn.close()
-    return float(row[0]) if row and row[0] is not None else 0.0
-
-
-def get_month_totals(year_month: str):
-    """
-    Итоги за месяц по ЗАКРЫТЫМ сменам, где есть хотя бы один заказ.
-    """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT id
-        FROM shifts
-        WHERE date LIKE ?
-          AND is_open = 0
-          AND EXISTS (SELECT 1 FROM orders o WHERE o.shift_id = shifts.id)
-        """,
-        (f"{year_month}%",),
-    )
-    shifts = cur.fetchall()
-
-    total_nal = 0.0
-    total_card = 0.0
-    total_tips = 0.0
-    total_beznal_add = 0.0
-
-    for (shift_id,) in shifts:
-        cur.execute(
-            "SELECT type, SUM(total - tips) "
-            "FROM orders WHERE shift_id = ? GROUP BY type",
-            (shift_id,),
-        )
-        for typ, summ in cur.fetchall():
-            summ = summ or 0.0
-            if typ == "нал":
-                total_nal += summ
-            elif typ == "карта":
-                total_card += summ
-
-        cur.execute(
-            "SELECT SUM(tips), SUM(beznal_added) "
-            "FROM orders WHERE shift_id = ?",
-            (shift_id,),
-        )
-        tips_sum, beznal_sum = cur.fetchone()
-        total_tips += tips_sum or 0.0
-        total_beznal_add += beznal_sum or 0.0
-
-    conn.close()
-
-    current_acc = get_current_accumulated_beznal()
-
-    return {
-        "нал": total_nal,
-        "карта": total_card,
-        "чаевые": total_tips,
-        "безнал_добавлено": total_beznal_add,
-        "всего": total_nal + total_card + total_tips,
-        "смен": len(shifts),
-        "накопленный_безнал": current_acc,
-    }
+    return reports.available_months()
+
+
+@cached()
+def get_current_accumulated_beznal() -> int:
+    return ledger.current_balance()
+
+
+MONTH_SHIFTS_LABELS = {
+    "date": "Дата",
+    "nal": "Нал",
+    "card": "Карта",
+    "tips": "Чаевые",
+    "beznal": "Δ безнал",
+    "km": "Км",
+    "fuel_liters": "Литры",
+    "fuel_price": "Цена",
+    "income": "Всего",
+    "fuel_cost": "Бензин",
+    "profit": "Прибыль",
+    "hours": "Часы",
+    "profit_per_km": "Прибыль/км",
+    "profit_per_hour": "Прибыль/час",
+}
 
 
+@cached()
 def get_month_shifts_details(year_month: str) -> pd.DataFrame:
     """
-    Одна строка на каждую ЗАКРЫТУЮ смену, у которой есть хотя бы один заказ.
-    Км/литры/цена берутся только из закрытия смены.
+    Одна строка на каждую ЗАКРЫТУЮ смену, в том числе без заказов (её бензин
+    всё равно уменьшает прибыль). Км/литры/цена берутся только из закрытия смены, бензин и прибыль
+    считаются в том же запросе (taxi.reports.shift_metrics).
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT id, date, km, fuel_liters, fuel_price
-        FROM shifts
-        WHERE date LIKE ?
-          AND is_open = 0
-          AND EXISTS (SELECT 1 FROM orders o WHERE o.shift_id = shifts.id)
-        ORDER BY date
-        """,
-        (f"{year_month}%",),
+    df = reports.shift_metrics(*month_range(year_month)).rename(
+        columns=MONTH_SHIFTS_LABELS
     )
-    shifts = cur.fetchall()
+    if not df.empty:
+        df.index = list(range(1, len(df) + 1))
+    return df
 
-    rows = []
 
-    for shift_id, date_str, km, fuel_liters, fuel_price in shifts:
-        cur.execute(
-            "SELECT type, SUM(total - tips) "
-            "FROM orders WHERE shift_id = ? GROUP BY type",
-            (shift_id,),
-        )
-        by_type = {t: s for t, s in cur.fetchall()}
+@cached()
+def get_month_totals(year_month: str):
+    """
+    Итоги за месяц по ЗАКРЫТЫМ сменам, включая смены без заказов.
 
-        cur.execute(
-            "SELECT SUM(tips), SUM(beznal_added) "
-            "FROM orders WHERE shift_id = ?",
-            (shift_id,),
-        )
-        tips_sum, beznal_sum = cur.fetchone()
-        tips_sum = tips_sum or 0.0
-        beznal_sum = beznal_sum or 0.0
+    Один агрегирующий запрос (taxi.reports.period_totals), суммы в копейках.
+    Прибыль на км и в час — None, если за месяц нет км или времени смен.
+    """
+    import pandas as pd
 
-        nal = by_type.get("нал", 0.0) or 0.0
-        card = by_type.get("карта", 0.0) or 0.0
-        total = nal + card + tips_sum
+    row = reports.period_totals(*month_range(year_month)) or {}
 
-        rows.append(
-            {
-                "Дата": date_str,
-                "Нал": nal,
-                "Карта": card,
-                "Чаевые": tips_sum,
-                "Δ безнал": beznal_sum,
-                "Км": km or 0,
-                "Литры": fuel_liters or 0.0,
-                "Цена": fuel_price or 0.0,
-                "Всего": total,
-            }
-        )
+    def ratio(key):
+        value = row.get(key)
+        return None if value is None or pd.isna(value) else float(value)
 
-    conn.close()
-    df = pd.DataFrame(rows)
-    if not df.empty:
-        df.index = list(range(1, len(df) + 1))
-    return df
+    return {
+        "нал": int(row.get("nal", 0)),
+        "карта": int(row.get("card", 0)),
+        "чаевые": int(row.get("tips", 0)),
+        "безнал_добавлено": int(row.get("beznal", 0)),
+        "всего": int(row.get("income", 0)),
+        "бензин": int(row.get("fuel_cost", 0)),
+        "прибыль": int(row.get("profit", 0)),
+        "прибыль_км": ratio("profit_per_km"),
+        "прибыль_час": ratio("profit_per_hour"),
+        "смен": int(row.get("shifts", 0)),
+        "накопленный_безнал": get_current_accumulated_beznal(),
+    }
 
 
+@cached()
 def get_closed_shift_id_by_date(date_str: str):
     """id ЗАКРЫТОЙ смены по дате."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id FROM shifts WHERE date = ? AND is_open = 0 ORDER BY id LIMIT 1",
-        (date_str,),
-    )
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else None
+    return get_closed_shift_id(date_str)
 
 
+@cached()
 def get_shift_orders_df(shift_id: int | None) -> pd.DataFrame:
     """
     Заказы в смене: одна строка = один заказ.
     """
+    import pandas as pd
+
     if shift_id is None:
         return pd.DataFrame()
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT type, amount, tips, beznal_added, total, order_time
-        FROM orders
-        WHERE shift_id = ?
-        ORDER BY id
-        """,
-        (shift_id,),
-    )
-    rows = cur.fetchall()
-    conn.close()
+    rows = get_shift_orders(shift_id)
 
     data = []
-    for typ, amount, tips, beznal_added, total, order_time in rows:
+    for pay_type, amount, tips, beznal_added, total, order_time in rows:
         data.append(
             {
                 "Время": order_time or "",
-                "Тип": "Нал" if typ == "нал" else "Карта",
-                "Сумма": amount or 0.0,
-                "Чаевые": tips or 0.0,
-                "Δ безнал": beznal_added or 0.0,
-                "Вам": total or 0.0,
+                "Тип": "Нал" if pay_type == PAY_NAL else "Карта",
+                "Сумма": amount,
+                "Чаевые": tips,
+                "Δ безнал": beznal_added,
+                "Вам": total,
             }
         )
 
@@ -230,51 +130,43 @@ def get_shift_orders_df(shift_id: int | None) -> pd.DataFrame:
     return df
 
 
+@cached()
 def get_orders_by_hour(date_str: str) -> pd.DataFrame:
     """
     Кол-во заказов по часам за дату.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT o.order_time
-        FROM orders o
-        JOIN shifts s ON o.shift_id = s.id
-        WHERE s.date = ?
-          AND s.is_open = 0
-          AND o.order_time IS NOT NULL
-        """,
-        (date_str,),
+    import pandas as pd
+
+    counts = reports.orders_by_hour(date_str)
+    return pd.DataFrame(
+        {"Час": list(range(24)), "Заказов": [counts.get(h, 0) for h in range(24)]}
     )
-    rows = cur.fetchall()
-    conn.close()
 
-    times = [r[0] for r in rows]
 
-    if not times:
-        return pd.DataFrame({"Час": list(range(24)), "Заказов": [0] * 24})
+@cached()
+def get_rollup_df(start: str, end: str, granularity: str) -> pd.DataFrame:
+    """Итоги за период по корзинам (см. taxi.reports.rollup)."""
+    return reports.rollup(start, end, granularity)
 
-    hours = []
-    for t in times:
-        try:
-            h = int(str(t)[0:2])
-            if 0 <= h <= 23:
-                hours.append(h)
-        except Exception:
-            continue
 
-    if not hours:
-        return pd.DataFrame({"Час": list(range(24)), "Заказов": [0] * 24})
+@cached()
+def get_weekday_hour_df(start: str, end: str, pay_type) -> pd.DataFrame:
+    """
+    Сетка 7 × 24 «день недели × час» из куба за [start, end] включительно,
+    пустые ячейки — нули.
+    """
+    import pandas as pd
 
-    s = pd.Series(hours)
-    counts = s.value_counts().sort_index()
+    df = cube.weekday_hour(
+        date_to_epoch(start), date_to_epoch(end) + DAY, pay_type
+    ).set_index(["weekday", "hour"])
+    grid = pd.MultiIndex.from_product([range(7), range(24)], names=["weekday", "hour"])
+    return df.reindex(grid, fill_value=0).reset_index()
 
-    df = pd.DataFrame({"Час": counts.index, "Заказов": counts.values})
-    full = pd.DataFrame({"Час": list(range(24))})
-    df = full.merge(df, on="Час", how="left").fillna(0)
-    df["Заказов"] = df["Заказов"].astype(int)
-    return df
+
+@cached()
+def get_data_range():
+    return reports.data_range()
 
 
 # ===== Справочники =====
@@ -294,6 +186,55 @@ month_name = {
 }
 
 
+GRANULARITY_LABELS = {
+    "day": "По дням",
+    "week": "По неделям",
+    "month": "По месяцам",
+    "year": "По годам",
+}
+
+ROLLUP_LABELS = {
+    "bucket": "Период",
+    "shifts": "Смен",
+    "orders": "Заказов",
+    "nal": "Нал",
+    "card": "Карта",
+    "tips": "Чаевые",
+    "beznal": "Δ безнал",
+    "km": "Км",
+    "fuel_liters": "Литры",
+    "fuel_cost": "Бензин",
+    "income": "Всего",
+    "profit": "Прибыль",
+    "hours": "Часы",
+    "profit_per_km": "Прибыль/км",
+    "profit_per_hour": "Прибыль/час",
+    "income_running": "Всего (нараст.)",
+    "profit_running": "Прибыль (нараст.)",
+    "beznal_running": "Δ безнал (нараст.)",
+}
+
+ROLLUP_MONEY = [
+    "Нал", "Карта", "Чаевые", "Δ безнал", "Бензин", "Всего", "Прибыль",
+    "Прибыль/час", "Всего (нараст.)", "Прибыль (нараст.)", "Δ безнал (нараст.)",
+]
+
+
+WEEKDAY_NAMES = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+HEATMAP_METRICS = {
+    "orders": "Заказов",
+    "gross": "Выручка",
+    "net": "Чистыми",
+}
+
+HEATMAP_PAY = {
+    None: "Все",
+    PAY_NAL: "Нал",
+    PAY_CARD: "Карта",
+}
+
+
 def format_month_option(s) -> str:
     if s is None:
         return "—"
@@ -306,10 +247,65 @@ def format_month_option(s) -> str:
     return s_str or "—"
 
 
+# ===== Графики =====
+def heatmap_chart(df: pd.DataFrame, value: str):
+    """Тепловая карта «день недели × час», цвет — по колонке value."""
+    import altair as alt
+
+    return (
+        alt.Chart(df)
+        .mark_rect()
+        .encode(
+            x=alt.X("Час:O"),
+            y=alt.Y("День:O", sort=WEEKDAY_NAMES),
+            color=alt.Color(f"{value}:Q", scale=alt.Scale(scheme="greens")),
+            tooltip=["День", "Час", "Заказов", "Выручка", "Чистыми"],
+        )
+    )
+
+
+# ===== Выгрузка =====
+EXPORT_FORMATS = {"xlsx": "Excel (.xlsx)", "csv": "CSV"}
+
+
+def export_controls(key: str, file_stem: str, title: str, table):
+    """
+    Выгрузка таблицы в файл: строится по кнопке, а не на каждом прогоне.
+
+    table() -> (заголовок, строки) из taxi.export. Файл сразу уходит в
+    кнопку скачивания и в session_state не хранится: на следующем прогоне
+    кнопка пропадает, файл строится заново по запросу.
+    """
+    c_fmt, c_build, c_get = st.columns([2, 2, 1])
+    fmt = c_fmt.radio(
+        "Формат",
+        list(EXPORT_FORMATS),
+        format_func=EXPORT_FORMATS.get,
+        horizontal=True,
+        label_visibility="collapsed",
+        key=f"{key}_fmt",
+    )
+    if c_build.button("Подготовить файл", width="stretch", key=f"{key}_build"):
+        with instrument.section(f"reports.{key}"):
+            data = export.build(fmt, title, table())
+        c_get.download_button(
+            "⬇ Скачать",
+            data=data,
+            file_name=f"{file_stem}.{fmt}",
+            mime=export.FILE_FORMATS[fmt],
+            on_click="ignore",
+            width="stretch",
+            key=f"{key}_download",
+        )
+
+
 # ===== UI =====
 st.set_page_config(page_title="Отчёты", page_icon="📊", layout="centered")
 st.title("📊 Отчёты")
 
+with instrument.section("reports.init_db"):
+    ensure_schema()
+
 year_months = get_available_year_months()
 
 if not year_months:
@@ -322,8 +318,9 @@ ym = st.selectbox(
     format_func=format_month_option,
 )
 
-df_shifts = get_month_shifts_details(ym)
-totals = get_month_totals(ym)
+with instrument.section("reports.month_queries"):
+    df_shifts = get_month_shifts_details(ym)
+    totals = get_month_totals(ym)
 
 st.write("---")
 
@@ -331,7 +328,7 @@ st.write("---")
 st.subheader("📄 Отчёт по смене")
 
 if df_shifts.empty:
-    st.write("Нет закрытых смен с заказами за выбранный месяц.")
+    st.write("Нет закрытых смен за выбранный месяц.")
 else:
     available_dates = df_shifts["Дата"].unique().tolist()
     selected_date = st.selectbox(
@@ -346,48 +343,63 @@ else:
     st.dataframe(
         df_shift_summary.style.format(
             {
-                "Нал": "{:.0f}",
-                "Карта": "{:.0f}",
-                "Чаевые": "{:.0f}",
-                "Δ безнал": "{:.0f}",
+                "Нал": fmt_amount,
+                "Карта": fmt_amount,
+                "Чаевые": fmt_amount,
+                "Δ безнал": fmt_amount,
                 "Км": "{:.0f}",
                 "Литры": "{:.1f}",
                 "Цена": "{:.1f}",
-                "Всего": "{:.0f}",
-            }
+                "Всего": fmt_amount,
+                "Бензин": fmt_amount,
+                "Прибыль": fmt_amount,
+                "Часы": "{:.1f}",
+                "Прибыль/км": lambda v: fmt_amount(v, 1),
+                "Прибыль/час": fmt_amount,
+            },
+            na_rep="—",
         ),
         width="stretch",
     )
 
-    shift_id = get_closed_shift_id_by_date(selected_date)
     st.markdown("**Заказы в смене**")
-
-    df_orders = get_shift_orders_df(shift_id)
+    with instrument.section("reports.shift_orders"):
+        shift_id = get_closed_shift_id_by_date(selected_date)
+        df_orders = get_shift_orders_df(shift_id)
     if df_orders.empty:
         st.write("Нет заказов для выбранной смены.")
     else:
         st.dataframe(
             df_orders.style.format(
                 {
-                    "Сумма": "{:.0f}",
-                    "Чаевые": "{:.0f}",
-                    "Δ безнал": "{:.0f}",
-                    "Вам": "{:.0f}",
+                    "Сумма": fmt_amount,
+                    "Чаевые": fmt_amount,
+                    "Δ безнал": fmt_amount,
+                    "Вам": fmt_amount,
                 }
             ),
             width="stretch",
         )
+        export_controls(
+            "export_shift_orders",
+            f"orders-{selected_date}",
+            "Заказы",
+            lambda: export.shift_orders_table(shift_id),
+        )
 
     # График заказов по часам
     st.markdown("**График заказов по часам**")
-    df_hours = get_orders_by_hour(selected_date)
-    df_hours["Час"] = df_hours["Час"].apply(lambda h: f"{h:02d}:00")
+    with instrument.section("reports.hour_chart"):
+        # результат из кэша общий — подписи часов делаем на копии
+        df_hours = get_orders_by_hour(selected_date).assign(
+            Час=lambda df: df["Час"].apply(lambda h: f"{h:02d}:00")
+        )
 
-    st.bar_chart(
-        data=df_hours,
-        x="Час",
-        y="Заказов",
-    )  # [web:823]
+        st.bar_chart(
+            data=df_hours,
+            x="Час",
+            y="Заказов",
+        )  # [web:823]
 
 # 2. ОТЧЁТ ПО СМЕНАМ ЗА МЕСЯЦ
 st.write("---")
@@ -399,31 +411,166 @@ else:
     st.dataframe(
         df_shifts.style.format(
             {
-                "Нал": "{:.0f}",
-                "Карта": "{:.0f}",
-                "Чаевые": "{:.0f}",
-                "Δ безнал": "{:.0f}",
+                "Нал": fmt_amount,
+                "Карта": fmt_amount,
+                "Чаевые": fmt_amount,
+                "Δ безнал": fmt_amount,
                 "Км": "{:.0f}",
                 "Литры": "{:.1f}",
                 "Цена": "{:.1f}",
-                "Всего": "{:.0f}",
-            }
+                "Всего": fmt_amount,
+                "Бензин": fmt_amount,
+                "Прибыль": fmt_amount,
+                "Часы": "{:.1f}",
+                "Прибыль/км": lambda v: fmt_amount(v, 1),
+                "Прибыль/час": fmt_amount,
+            },
+            na_rep="—",
         ),
         width="stretch",
     )
+    export_controls(
+        "export_month_shifts",
+        f"shifts-{ym}",
+        "Смены",
+        lambda: export.shifts_table(*month_range(ym)),
+    )
 
 # 3. ОТЧЁТ ЗА МЕСЯЦ (ИТОГИ)
 st.write("---")
 st.subheader("📊 Отчёт за месяц")
 
 col1, col2, col3 = st.columns(3)
-col1.metric("Нал", f"{totals['нал']:.0f} ₽")
-col2.metric("Карта", f"{totals['карта']:.0f} ₽")
-col3.metric("Чаевые", f"{totals['чаевые']:.0f} ₽")
+col1.metric("Нал", fmt_rub(totals["нал"]))
+col2.metric("Карта", fmt_rub(totals["карта"]))
+col3.metric("Чаевые", fmt_rub(totals["чаевые"]))
 
 col4, col5, col6 = st.columns(3)
-col4.metric("Изм. безнала (за месяц)", f"{totals['безнал_добавлено']:.0f} ₽")
-col5.metric("Накопленный безнал (текущий)", f"{totals['накопленный_безнал']:.0f} ₽")
+col4.metric("Изм. безнала (за месяц)", fmt_rub(totals["безнал_добавлено"]))
+col5.metric("Накопленный безнал (текущий)", fmt_rub(totals["накопленный_безнал"]))
 col6.metric("Смен", f"{totals['смен']}")
-total_income = totals["всего"]
-fuel_cost = 0.0 # Здесь можно добавить логику подсчёта затрат на бензин, если нужно 
\ No newline at end of file
+
+col7, col8, col9, col10 = st.columns(4)
+col7.metric("Бензин", fmt_rub(totals["бензин"]))
+col8.metric("Чистая прибыль", fmt_rub(totals["прибыль"]))
+col9.metric(
+    "Прибыль/км",
+    "—" if totals["прибыль_км"] is None else fmt_rub(totals["прибыль_км"], 1),
+)
+col10.metric(
+    "Прибыль/час",
+    "—" if totals["прибыль_час"] is None else fmt_rub(totals["прибыль_час"]),
+)
+
+# 4. ОТЧЁТ ЗА ПРОИЗВОЛЬНЫЙ ПЕРИОД
+st.write("---")
+st.subheader("📈 Отчёт за период")
+
+first_day, last_day = get_data_range()
+col_period, col_group = st.columns([2, 1])
+period = col_period.date_input(
+    "Период",
+    value=(max(first_day, last_day.replace(month=1, day=1)), last_day),
+    min_value=first_day,
+    max_value=last_day,
+    format="DD.MM.YYYY",
+)
+granularity = col_group.selectbox(
+    "Группировка",
+    list(GRANULARITY_LABELS),
+    index=2,
+    format_func=GRANULARITY_LABELS.get,
+)
+
+# пока выбран только первый день диапазона, date_input отдаёт одну дату
+if len(period) != 2:
+    st.caption("Выберите конец периода.")
+else:
+    with instrument.section("reports.rollup"):
+        df_rollup = get_rollup_df(
+            period[0].isoformat(), period[1].isoformat(), granularity
+        ).rename(columns=ROLLUP_LABELS)
+    if df_rollup.empty:
+        st.write("Нет закрытых смен за выбранный период.")
+    else:
+        st.dataframe(
+            df_rollup.style.format(
+                {
+                    **{col: fmt_amount for col in ROLLUP_MONEY},
+                    "Км": "{:.0f}",
+                    "Литры": "{:.1f}",
+                    "Часы": "{:.1f}",
+                    "Прибыль/км": lambda v: fmt_amount(v, 1),
+                },
+                na_rep="—",
+            ),
+            hide_index=True,
+            width="stretch",
+        )
+        running = ["Всего (нараст.)", "Прибыль (нараст.)"]
+        with instrument.section("reports.rollup_chart"):
+            st.line_chart(
+                df_rollup.assign(**{col: df_rollup[col] / KOPECKS for col in running}),
+                x="Период",
+                y=running,
+            )
+
+        # выгрузка — не итоги, а сами смены и заказы за период
+        period_start, period_end = period[0].isoformat(), period[1].isoformat()
+        period_ts = (date_to_epoch(period_start), date_to_epoch(period_end) + DAY)
+        period_stem = f"{period_start}_{period_end}"
+        st.markdown("**Смены за период**")
+        export_controls(
+            "export_period_shifts",
+            f"shifts-{period_stem}",
+            "Смены",
+            lambda: export.shifts_table(*period_ts),
+        )
+        st.markdown("**Заказы за период**")
+        export_controls(
+            "export_period_orders",
+            f"orders-{period_stem}",
+            "Заказы",
+            lambda: export.orders_table(*period_ts),
+        )
+
+# 5. ТЕПЛОВАЯ КАРТА «ДЕНЬ НЕДЕЛИ × ЧАС»
+st.write("---")
+st.subheader("🗓 Когда выгоднее работать")
+
+heat_period = st.date_input(
+    "Период для карты",
+    value=(first_day, last_day),
+    min_value=first_day,
+    max_value=last_day,
+    format="DD.MM.YYYY",
+)
+col_metric, col_pay = st.columns(2)
+heat_metric = col_metric.selectbox(
+    "Показатель", list(HEATMAP_METRICS), format_func=HEATMAP_METRICS.get
+)
+heat_pay = col_pay.selectbox(
+    "Тип оплаты", list(HEATMAP_PAY), format_func=HEATMAP_PAY.get
+)
+
+if len(heat_period) != 2:
+    st.caption("Выберите конец периода.")
+else:
+    with instrument.section("reports.heatmap_query"):
+        df_heat = get_weekday_hour_df(
+            heat_period[0].isoformat(), heat_period[1].isoformat(), heat_pay
+        )
+    df_heat = df_heat.assign(
+        День=lambda df: df["weekday"].map(WEEKDAY_NAMES.__getitem__),
+        Час=lambda df: df["hour"],
+        Заказов=lambda df: df["orders"],
+        Выручка=lambda df: df["gross"] / KOPECKS,
+        Чистыми=lambda df: df["net"] / KOPECKS,
+    )
+    if not df_heat["orders"].any():
+        st.write("Нет заказов с временем за выбранный период.")
+    else:
+        value = HEATMAP_METRICS[heat_metric]
+        heatmap = heatmap_chart(df_heat, value)
+        with instrument.section("reports.heatmap_chart"):
+            st.altair_chart(heatmap)
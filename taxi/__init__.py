@@ -0,0 +1,6 @@
+"""
+Данные и расчёты приложения учёта такси.
+
+Модули пакета не импортируют Streamlit: их вызывают страницы приложения,
+а также скрипты (импорт по расписанию, бенчмарки).
+"""
@@ -0,0 +1,87 @@
+"""
+Кэш результатов запросов на чтение, привязанный к поколению данных.
+
+Результат хранится, пока БД не изменилась (db.data_generation()): первый
+вызов после любой записи сбрасывает кэш функции целиком. Размер кэша
+ограничен, лишние записи вытесняются по LRU. Попадание в кэш стоит
+одного PRAGMA data_version и не выполняет ни одного запроса к таблицам.
+
+Состояние кэшей хранится здесь, в модуле, по файлу и имени функции: страницы
+Streamlit заново выполняются при каждом rerun и заново определяют свои
+функции, а кэш при этом сохраняется.
+
+Возвращаемые объекты общие для всех вызовов — их нельзя изменять.
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+
+from taxi import db
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _cache_state(name: str):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = (
+                OrderedDict(),
+                {"generation": None, "hits": 0, "misses": 0},
+                threading.Lock(),
+            )
+        return _registry[name]
+
+
+def cached(maxsize: int = 32):
+    """Декоратор: мемоизация по позиционным аргументам + поколению данных."""
+
+    def decorator(func):
+        entries, state, lock = _cache_state(
+            f"{func.__code__.co_filename}:{func.__qualname__}"
+        )
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            generation = db.data_generation()
+            with lock:
+                if state["generation"] != generation:
+                    entries.clear()
+                    state["generation"] = generation
+                elif args in entries:
+                    entries.move_to_end(args)
+                    state["hits"] += 1
+                    return entries[args]
+                state["misses"] += 1
+
+            value = func(*args)
+
+            with lock:
+                # за время вычисления данные могли поменяться — тогда не кладём
+                if state["generation"] == generation:
+                    entries[args] = value
+                    entries.move_to_end(args)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return value
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                state["generation"] = None
+
+        def cache_info() -> dict:
+            with lock:
+                return {
+                    "hits": state["hits"],
+                    "misses": state["misses"],
+                    "size": len(entries),
+                    "maxsize": maxsize,
+                }
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        return wrapper
+
+    return decorator
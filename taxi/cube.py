@@ -0,0 +1,133 @@
+"""
+Куб заработка «день × час × тип оплаты» (earnings_cube), который ведут
+триггеры на orders.
+
+Строка куба — один час одного дня по ordered_at: число заказов, выручка
+(сумма + чаевые) и чистыми (total). Тепловая карта «день недели × час» за
+любой период собирается из куба, а не из всех заказов: строк в нём не
+больше 24 × 2 на день. Заказы без ordered_at в куб не попадают.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from taxi import dates, db
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+CUBE_FIELDS = ("orders", "gross", "net")
+
+CUBE_FROM_ORDERS_SQL = """
+    SELECT
+        ordered_at - ordered_at % {day},
+        ordered_at % {day} / 3600,
+        pay_type,
+        COUNT(*),
+        SUM(amount + COALESCE(tips, 0)),
+        SUM(total)
+    FROM orders
+    WHERE ordered_at IS NOT NULL
+    GROUP BY 1, 2, 3
+""".format(day=dates.DAY)
+
+
+def _key(row: str) -> dict:
+    """Ключ куба по моменту заказа NEW/OLD: полночь дня и час."""
+    return {
+        "day": f"{row}.ordered_at - {row}.ordered_at % {dates.DAY}",
+        "hour": f"{row}.ordered_at % {dates.DAY} / 3600",
+    }
+
+
+def create_cube_triggers(conn):
+    """Триггеры INSERT/UPDATE/DELETE на orders, поддерживающие earnings_cube."""
+    new, old = _key("NEW"), _key("OLD")
+    add_new = f"""
+            INSERT INTO earnings_cube (day, hour, pay_type, orders, gross, net)
+            SELECT {new["day"]}, {new["hour"]}, NEW.pay_type,
+                   1, NEW.amount + COALESCE(NEW.tips, 0), NEW.total
+            WHERE NEW.ordered_at IS NOT NULL
+            ON CONFLICT (day, hour, pay_type) DO UPDATE SET
+                orders = orders + 1,
+                gross = gross + excluded.gross,
+                net = net + excluded.net;
+    """
+    remove_old = f"""
+            UPDATE earnings_cube SET
+                orders = orders - 1,
+                gross = gross - (OLD.amount + COALESCE(OLD.tips, 0)),
+                net = net - OLD.total
+            WHERE OLD.ordered_at IS NOT NULL
+              AND day = {old["day"]} AND hour = {old["hour"]} AND pay_type = OLD.pay_type;
+            DELETE FROM earnings_cube
+            WHERE OLD.ordered_at IS NOT NULL
+              AND day = {old["day"]} AND hour = {old["hour"]} AND pay_type = OLD.pay_type
+              AND orders = 0;
+    """
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_cube_insert
+        AFTER INSERT ON orders
+        BEGIN {add_new}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_cube_delete
+        AFTER DELETE ON orders
+        BEGIN {remove_old}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_cube_update
+        AFTER UPDATE OF ordered_at, pay_type, amount, tips, total ON orders
+        BEGIN {remove_old} {add_new}
+        END
+        """
+    )
+
+
+def rebuild_cube(conn):
+    """Заполняет earnings_cube заново по сырым заказам."""
+    conn.execute("DELETE FROM earnings_cube")
+    conn.execute(
+        "INSERT INTO earnings_cube (day, hour, pay_type, orders, gross, net) "
+        + CUBE_FROM_ORDERS_SQL
+    )
+
+
+def weekday_hour(start_ts: int, end_ts: int, pay_type=None) -> pd.DataFrame:
+    """
+    Итоги по дню недели (0 — понедельник) и часу за [start_ts, end_ts).
+
+    pay_type=None — все типы оплаты. Колонки: weekday, hour и CUBE_FIELDS,
+    суммы в копейках. Пустые ячейки не возвращаются.
+    """
+    # pandas — только здесь: модуль грузят миграции на старте app.py
+    import pandas as pd
+
+    # 01.01.1970 — четверг, поэтому понедельник = (дней + 3) % 7
+    cur = db.get_connection().execute(
+        f"""
+        SELECT
+            (day / {dates.DAY} + 3) % 7 AS weekday,
+            hour,
+            SUM(orders),
+            SUM(gross),
+            SUM(net)
+        FROM earnings_cube
+        WHERE day >= :start AND day < :end
+          AND (:pay_type IS NULL OR pay_type = :pay_type)
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        """,
+        {"start": start_ts, "end": end_ts, "pay_type": pay_type},
+    )
+    return pd.DataFrame.from_records(
+        cur.fetchall(), columns=["weekday", "hour", *CUBE_FIELDS]
+    )
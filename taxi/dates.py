@@ -0,0 +1,103 @@
+"""
+Даты и время смен/заказов как целые epoch-секунды.
+
+Время в приложении местное и без часового пояса, поэтому хранится
+«по настенным часам»: datetime без tzinfo переводится в секунды так, как
+будто это UTC. Тогда strftime(..., 'unixepoch') в SQLite возвращает те же
+дату и час, что видел водитель, а переход на летнее время не сдвигает
+смены. Текстовая shifts.date остаётся в нормализованном виде ГГГГ-ММ-ДД
+для показа и тарифов, а фильтры идут по целым колонкам с индексами.
+"""
+
+import calendar
+from datetime import datetime, timedelta
+
+# форматы, которые встречаются в старых данных и таблицах импорта
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d.%m.%Y",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%y",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+)
+
+DAY = 24 * 60 * 60
+
+
+def to_epoch(dt: datetime) -> int:
+    return calendar.timegm(dt.timetuple())
+
+
+def from_epoch(ts: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=ts)
+
+
+def now_epoch() -> int:
+    return to_epoch(datetime.now())
+
+
+def parse_datetime(text):
+    """datetime из строки в одном из DATE_FORMATS или None."""
+    if text is None:
+        return None
+    text = str(text).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(text):
+    """Дата в виде ГГГГ-ММ-ДД или None, если строку не разобрать."""
+    dt = parse_datetime(text)
+    return dt.strftime("%Y-%m-%d") if dt else None
+
+
+def date_to_epoch(date_str: str) -> int:
+    """Полночь даты ГГГГ-ММ-ДД."""
+    return to_epoch(datetime.strptime(date_str, "%Y-%m-%d"))
+
+
+def month_range(year_month: str) -> tuple[int, int]:
+    """Полуинтервал [начало месяца, начало следующего) в epoch-секундах."""
+    year, month = int(year_month[0:4]), int(year_month[5:7])
+    start = to_epoch(datetime(year, month, 1))
+    if month == 12:
+        year, month = year + 1, 1
+    else:
+        month += 1
+    return start, to_epoch(datetime(year, month, 1))
+
+
+def _minutes(hhmm):
+    """"ЧЧ:ММ" -> минуты от полуночи или None."""
+    try:
+        hours, minutes = str(hhmm).strip()[0:5].split(":")
+        value = int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+    return value if 0 <= value < 24 * 60 else None
+
+
+def order_epoch(date_str: str, order_time, opened_at=None):
+    """
+    Момент заказа по дате смены и времени "ЧЧ:ММ".
+
+    Если смена открыта вечером, а заказ раньше времени открытия, — заказ
+    после полуночи, т.е. на следующий день. Без времени — None.
+    """
+    order_min = _minutes(order_time)
+    if order_min is None or not date_str:
+        return None
+    ts = date_to_epoch(date_str) + order_min * 60
+    opened = parse_datetime(opened_at)
+    if opened is not None and (opened.hour or opened.minute):
+        if order_min < opened.hour * 60 + opened.minute:
+            ts += DAY
+    return ts
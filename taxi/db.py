@@ -0,0 +1,223 @@
+"""
+Общий менеджер соединений с SQLite для app.py и страниц pages/.
+
+Соединение кэшируется на поток: повторные вызовы get_connection() в рамках
+одного прогона скрипта Streamlit не открывают файл заново. Streamlit
+запускает каждый прогон в новом потоке, поэтому соединения завершившихся
+потоков закрываются при следующем get_connection(). Соединения работают
+в режиме autocommit, запись оформляется через transaction().
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from taxi import instrument
+
+# путь к файлу БД; TAXI_DB переопределяет его для скриптов и бенчмарков
+DB_NAME = os.environ.get("TAXI_DB", "taxi.db")
+
+# ===== PRAGMA =====
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16 * 1024       # отрицательное значение cache_size = КиБ
+MMAP_SIZE = 64 * 1024 * 1024
+
+_local = threading.local()
+# соединение -> поток-владелец (None — соединение наблюдателя)
+_all_connections = {}
+_all_lock = threading.Lock()
+# растёт при invalidate_connections()/close_all_connections(): соединения,
+# открытые раньше, устарели — поток переоткроет своё вне транзакции
+_epoch = 0
+
+
+def _configure(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _open() -> sqlite3.Connection:
+    # isolation_level=None: без неявных BEGIN, транзакции только явные
+    conn = sqlite3.connect(
+        DB_NAME,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        factory=instrument.connection_factory(),
+    )
+    _configure(conn)
+    return conn
+
+
+def _close(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _discard(conn: sqlite3.Connection):
+    with _all_lock:
+        _all_connections.pop(conn, None)
+    _close([conn])
+
+
+def _prune_dead_threads():
+    """Закрывает соединения потоков, которые уже завершились."""
+    with _all_lock:
+        dead = [
+            conn for conn, owner in _all_connections.items()
+            if owner is not None and not owner.is_alive()
+        ]
+        for conn in dead:
+            del _all_connections[conn]
+    _close(dead)
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Соединение текущего потока (создаётся при первом обращении; заодно
+    закрываются соединения завершившихся потоков).
+
+    Устаревшее соединение (эпоха сменилась) поток закрывает сам и только вне
+    transaction(): начатая транзакция доводится на старом соединении.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.epoch != _epoch and _local.depth == 0:
+        _discard(conn)
+        conn = None
+    if conn is None:
+        _prune_dead_threads()
+        conn = _open()
+        _local.conn = conn
+        _local.epoch = _epoch
+        _local.depth = 0
+        with _all_lock:
+            _all_connections[conn] = threading.current_thread()
+    return conn
+
+
+@contextmanager
+def transaction(immediate: bool = True):
+    """
+    Явная транзакция на соединении текущего потока.
+
+    Внешний уровень — BEGIN IMMEDIATE (блокировка на запись берётся сразу,
+    без риска SQLITE_BUSY посреди транзакции), вложенные — SAVEPOINT.
+    """
+    conn = get_connection()
+    depth = _local.depth
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    else:
+        conn.execute(f"SAVEPOINT sp_{depth}")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        if depth == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp_{depth}")
+            conn.execute(f"RELEASE sp_{depth}")
+        raise
+    else:
+        _local.depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+        else:
+            conn.execute(f"RELEASE sp_{depth}")
+
+
+_watch = {"conn": None, "epoch": None}
+_watch_lock = threading.Lock()
+
+
+def data_generation() -> tuple:
+    """
+    Поколение данных БД: меняется после любого коммита в файл.
+
+    Берётся PRAGMA data_version отдельного соединения, которое само ничего
+    не пишет, — значит, его счётчик сдвигают коммиты всех остальных
+    соединений, в том числе из других процессов. Эпоха соединений в
+    ключе отличает файл, пересозданный после remove_db_files().
+    """
+    with _watch_lock:
+        if _watch["conn"] is None or _watch["epoch"] != _epoch:
+            # соединение наблюдателя используется только под _watch_lock
+            if _watch["conn"] is not None:
+                _discard(_watch["conn"])
+            _watch["conn"] = _open()
+            _watch["epoch"] = _epoch
+            with _all_lock:
+                _all_connections[_watch["conn"]] = None
+        version = _watch["conn"].execute("PRAGMA data_version").fetchone()[0]
+        return _watch["epoch"], version
+
+
+@contextmanager
+def tracked_transaction():
+    """
+    transaction(), которая сообщает поколение данных до и после своей записи.
+
+    Отдаёт dict {"before", "after"}. Внутри BEGIN IMMEDIATE чужие коммиты
+    невозможны, поэтому "before" — поколение ровно перед нашей записью.
+    "after" читается сразу после коммита; PRAGMA data_version нашего
+    соединения меняется только от чужих коммитов, и если кто-то успел
+    записать следом, "after" остаётся None — снимок тогда надо перечитать.
+    Только внешний уровень: во вложенной транзакции коммит не наш.
+    """
+    get_connection()  # заводит _local.depth для потока
+    if _local.depth:
+        raise RuntimeError("tracked_transaction() не может быть вложенной")
+    result = {"before": None, "after": None}
+    with transaction() as conn:
+        result["before"] = data_generation()
+        own_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        yield result
+    after = data_generation()
+    if conn.execute("PRAGMA data_version").fetchone()[0] == own_version:
+        result["after"] = after
+
+
+def invalidate_connections():
+    """
+    Помечает все соединения устаревшими, ничего не закрывая: каждый поток
+    переоткроет своё в get_connection(), когда не будет внутри транзакции.
+    Так меняют настройки соединений (фабрику инструментовки) на ходу.
+    """
+    global _epoch
+    with _all_lock:
+        _epoch += 1
+
+
+def close_all_connections():
+    """
+    Закрывает все закэшированные соединения, в том числе чужих потоков.
+
+    Только когда других сессий нет или файл всё равно удаляется
+    (remove_db_files, скрипты и бенчмарки); для смены настроек на ходу —
+    invalidate_connections().
+    """
+    global _epoch
+    with _all_lock:
+        _epoch += 1
+        conns = list(_all_connections)
+        _all_connections.clear()
+    _close(conns)
+
+
+def remove_db_files():
+    """Удаляет файл БД вместе с журналом WAL и shm."""
+    close_all_connections()
+    for suffix in ("", "-wal", "-shm"):
+        path = DB_NAME + suffix
+        if os.path.exists(path):
+            os.remove(path)
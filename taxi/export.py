@@ -0,0 +1,165 @@
+"""
+Выгрузка отчётов в XLSX и CSV без DataFrame.
+
+Таблица выгрузки — (заголовок, итератор строк). Строки читаются из курсора
+SQLite порциями по FETCH_ROWS и сразу пишутся в файл: в книгу openpyxl в
+режиме write_only (строки уходят во временный XML на диске) или в CSV.
+В памяти только текущая порция, сколько бы лет заказов ни выгружалось;
+готовый файл собирается во временном файле на диске.
+
+Деньги — рубли числами (не строками), чтобы в таблице их можно было
+суммировать; пустые значения (нет км или времени смены) — пустые ячейки.
+"""
+
+import csv
+import io
+import tempfile
+
+from taxi import db, money, reports
+from taxi.shifts import SHIFT_ORDERS_SQL
+
+FETCH_ROWS = 1000
+
+FILE_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+# порядок — как в reports.SHIFT_COLUMNS
+SHIFTS_HEADER = (
+    "Дата", "Нал", "Карта", "Чаевые", "Δ безнал", "Км", "Литры", "Цена",
+    "Всего", "Бензин", "Прибыль", "Часы", "Прибыль/км", "Прибыль/час",
+)
+SHIFT_ORDERS_HEADER = ("Время", "Тип", "Сумма", "Чаевые", "Δ безнал", "Вам")
+ORDERS_HEADER = (
+    "Дата", "Время", "Тип", "Сумма", "Чаевые", "Комиссия", "Вам", "Δ безнал",
+)
+
+ORDERS_SQL = """
+    SELECT s.date, o.order_time, o.pay_type, o.amount, o.tips,
+           o.commission, o.total, o.beznal_added
+    FROM shifts s
+    JOIN orders o ON o.shift_id = s.id
+    WHERE s.is_open = 0
+      AND s.date_ts >= :start AND s.date_ts < :end
+    ORDER BY s.date_ts, s.id, o.id
+"""
+
+
+def _rub(kopecks):
+    return None if kopecks is None else round(kopecks / money.KOPECKS, 2)
+
+
+def _round(value, digits: int):
+    return None if value is None else round(value, digits)
+
+
+def _pay_name(pay_type) -> str:
+    return money.PAY_NAMES.get(pay_type, "").capitalize()
+
+
+def _rows(sql: str, params, convert):
+    """Строки запроса порциями по FETCH_ROWS, каждая через convert()."""
+    cur = db.get_connection().execute(sql, params)
+    try:
+        while True:
+            batch = cur.fetchmany(FETCH_ROWS)
+            if not batch:
+                break
+            for row in batch:
+                yield convert(row)
+    finally:
+        cur.close()
+
+
+# ===== ТАБЛИЦЫ =====
+def shifts_table(start_ts: int, end_ts: int):
+    """Закрытые смены за [start_ts, end_ts) с экономикой, как в отчёте по сменам."""
+
+    def convert(row):
+        (date_str, nal, card, tips, beznal, km, liters, price,
+         income, fuel_cost, profit, hours, per_km, per_hour) = row
+        return (
+            date_str, _rub(nal), _rub(card), _rub(tips), _rub(beznal),
+            km, _round(liters, 2), _round(price, 2),
+            _rub(income), _rub(fuel_cost), _rub(profit),
+            _round(hours, 2), _rub(per_km), _rub(per_hour),
+        )
+
+    params = {"start": start_ts, "end": end_ts}
+    return SHIFTS_HEADER, _rows(reports.SHIFTS_SQL, params, convert)
+
+
+def shift_orders_table(shift_id: int):
+    """Заказы одной смены в порядке добавления."""
+
+    def convert(row):
+        pay_type, amount, tips, beznal_added, total, order_time = row
+        return (
+            order_time or "", _pay_name(pay_type), _rub(amount), _rub(tips),
+            _rub(beznal_added), _rub(total),
+        )
+
+    return SHIFT_ORDERS_HEADER, _rows(SHIFT_ORDERS_SQL, (shift_id,), convert)
+
+
+def orders_table(start_ts: int, end_ts: int):
+    """Все заказы закрытых смен за [start_ts, end_ts)."""
+
+    def convert(row):
+        date_str, order_time, pay_type, amount, tips, commission, total, beznal_added = row
+        return (
+            date_str, order_time or "", _pay_name(pay_type), _rub(amount),
+            _rub(tips), _rub(commission), _rub(total), _rub(beznal_added),
+        )
+
+    params = {"start": start_ts, "end": end_ts}
+    return ORDERS_HEADER, _rows(ORDERS_SQL, params, convert)
+
+
+# ===== ФАЙЛЫ =====
+def write_xlsx(fileobj, title: str, header, rows):
+    """Книга с одним листом title; строки пишутся потоком (write_only)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def iter_csv(header, rows):
+    """CSV порциями байт UTF-8; BOM в начале — чтобы Excel узнал кодировку."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % FETCH_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def build(fmt: str, title: str, table) -> bytes:
+    """
+    Файл выгрузки table = (заголовок, строки) в формате fmt (FILE_FORMATS).
+
+    Собирается во временном файле; в память читается только готовый файл —
+    кнопке скачивания Streamlit нужны байты.
+    """
+    if fmt not in FILE_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    header, rows = table
+    with tempfile.TemporaryFile() as f:
+        if fmt == "xlsx":
+            write_xlsx(f, title, header, rows)
+        else:
+            for chunk in iter_csv(header, rows):
+                f.write(chunk)
+        f.seek(0)
+        return f.read()
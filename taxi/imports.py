@@ -0,0 +1,423 @@
+"""
+Колоночный импорт заказов (Excel/CSV/Google Sheets).
+
+Вместо обхода строк через iterrows() вся таблица разбирается и
+проверяется целыми колонками pandas, суммы считаются векторно, смены
+находятся по одной карте дата -> id, заказы пишутся одним executemany,
+а в журнал безнала пишется по итоговой записи на каждую дату порции.
+Тариф каждой строки выбирается по дате её смены.
+
+Большие файлы читаются порциями (import_orders_stream): каждая порция
+пишется в своей транзакции, а номер последней закоммиченной строки
+сохраняется в import_jobs, так что прерванный импорт можно продолжить.
+"""
+
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from taxi import dates, db, ledger, money, tariffs
+
+CARD_TYPES = ("безнал", "card", "карта")
+
+IMPORT_CHUNK_ROWS = 5000
+MAX_KEPT_ERRORS = 20
+
+# сколько дат подставлять в один IN (...): лимит параметров старых SQLite — 999
+_IN_CHUNK = 500
+
+
+# ===== ЧТЕНИЕ ПОРЦИЯМИ =====
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def iter_csv_chunks(source, chunksize: int = IMPORT_CHUNK_ROWS):
+    """CSV порциями по chunksize строк; индекс строк сквозной по всему файлу."""
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        yield normalize_columns(chunk)
+
+
+def open_xlsx_chunks(source, chunksize: int = IMPORT_CHUNK_ROWS):
+    """
+    Первый лист .xlsx через read-only итератор openpyxl.
+
+    Возвращает (итератор порций, число строк данных или None, если
+    в файле нет размеров листа).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    ws = wb.active
+    total = ws.max_row - 1 if ws.max_row else None
+
+    def chunks():
+        try:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(c).strip() if c is not None else "" for c in header]
+            start = 0
+            buf = []
+            for row in rows:
+                buf.append(row)
+                if len(buf) == chunksize:
+                    yield pd.DataFrame(buf, columns=columns, index=range(start, start + len(buf)))
+                    start += len(buf)
+                    buf = []
+            if buf:
+                yield pd.DataFrame(buf, columns=columns, index=range(start, start + len(buf)))
+        finally:
+            wb.close()
+
+    return chunks(), total
+
+
+def open_file_chunks(fileobj, name: str, size=None):
+    """
+    (итератор порций, fraction) по расширению имени файла.
+
+    fraction(stats) -> доля выполнения 0..1 или None, если оценить нельзя.
+    """
+    name = name.lower()
+    if name.endswith(".csv"):
+        size = size or 1
+        return iter_csv_chunks(fileobj), lambda _: fileobj.tell() / size
+    if name.endswith(".xlsx"):
+        chunks, total = open_xlsx_chunks(fileobj)
+        if total:
+            return chunks, lambda stats: stats["rows_done"] / total
+        return chunks, None
+    # старый .xls openpyxl не читает — такой файл загружаем целиком
+    return iter([normalize_columns(pd.read_excel(fileobj))]), None
+
+
+def gsheet_csv_url(sheet_url: str) -> str:
+    """Ссылка на лист Google Sheets -> ссылка на его выгрузку в CSV."""
+    base_url = sheet_url.split("#")[0]
+    return base_url.replace("/edit?gid=", "/export?format=csv&gid=")
+
+
+def file_fingerprint(fileobj, block_size: int = 1 << 20) -> str:
+    """Хэш содержимого файла (читается блоками), позиция возвращается в начало."""
+    h = hashlib.sha1()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+# ===== РАЗБОР КОЛОНОК =====
+def drop_empty_amounts(df: pd.DataFrame) -> pd.DataFrame:
+    """Строки без суммы — не заказы (пустые строки таблицы), их просто пропускаем."""
+    amount = df["Сумма"].replace(r"^\s*$", pd.NA, regex=True)
+    return df[amount.notna()]
+
+
+def _text_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Колонка как строки без пробелов по краям; нет колонки/NaN -> ''."""
+    if name not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    col = df[name]
+    if pd.api.types.is_datetime64_any_dtype(col):
+        # дата из Excel — в том же виде, в каком смены открывает app.py
+        return col.dt.strftime("%Y-%m-%d").fillna("")
+    return col.astype(object).where(col.notna(), "").astype(str).str.strip()
+
+
+def _number_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Колонка как float; пустые/мусор -> NaN, запятая как десятичный разделитель."""
+    if name not in df.columns:
+        return pd.Series(np.nan, index=df.index, dtype=float)
+    col = df[name]
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float)
+    text = _text_column(df, name).str.replace(",", ".", regex=False)
+    return pd.to_numeric(text, errors="coerce")
+
+
+def _to_kopecks(rubles: pd.Series) -> pd.Series:
+    """Рубли -> целые копейки, как money.to_kopecks."""
+    return (rubles * money.KOPECKS).round().astype(np.int64)
+
+
+def parse_orders(df: pd.DataFrame):
+    """
+    Проверяет и нормализует таблицу заказов (колонки Дата, Тип, Сумма, Чаевые).
+
+    Возвращает (orders, errors): orders — DataFrame с колонками
+    date, pay_type, amount, tips (копейки) по корректным строкам (индекс исходный),
+    errors — список сообщений по отброшенным строкам.
+    """
+    raw_amount = df["Сумма"] if "Сумма" in df.columns else pd.Series(index=df.index)
+    amount = _number_column(df, "Сумма")
+    date_text = _text_column(df, "Дата")
+    # разбираем каждую уникальную дату один раз, всё — к виду ГГГГ-ММ-ДД
+    date = date_text.map({d: dates.parse_date(d) for d in date_text.unique() if d})
+
+    bad_amount = amount.isna()
+    bad_date = ~bad_amount & (date_text == "")
+    bad_format = ~bad_amount & ~bad_date & date.isna()
+
+    errors = pd.concat(
+        [
+            pd.Series(
+                [
+                    f"Строка {idx}: пустая или некорректная сумма ({raw!r}), пропускаю."
+                    for idx, raw in raw_amount[bad_amount].items()
+                ],
+                index=np.flatnonzero(bad_amount),
+                dtype=object,
+            ),
+            pd.Series(
+                [
+                    f"Строка {idx}: пустая дата при сумме {value}, пропускаю."
+                    for idx, value in amount[bad_date].items()
+                ],
+                index=np.flatnonzero(bad_date),
+                dtype=object,
+            ),
+            pd.Series(
+                [
+                    f"Строка {idx}: некорректная дата ({raw!r}), пропускаю."
+                    for idx, raw in date_text[bad_format].items()
+                ],
+                index=np.flatnonzero(bad_format),
+                dtype=object,
+            ),
+        ]
+    ).sort_index().tolist()
+
+    ok = ~(bad_amount | bad_date | bad_format)
+    type_text = _text_column(df, "Тип").str.lower()
+    orders = pd.DataFrame(
+        {
+            "date": date[ok],
+            "pay_type": np.where(
+                type_text[ok].isin(CARD_TYPES), money.PAY_CARD, money.PAY_NAL
+            ),
+            "amount": _to_kopecks(amount[ok]),
+            "tips": _to_kopecks(_number_column(df, "Чаевые")[ok].fillna(0.0)),
+        },
+        index=df.index[ok],
+    )
+    return orders, errors
+
+
+def compute_amounts(orders: pd.DataFrame, tariff_list):
+    """
+    Добавляет tariff_id / commission / total / beznal_added по тем же
+    правилам, что calc_order. tariff_list — результат tariffs.list_tariffs().
+    """
+    valid_from = np.array([t[1] for t in tariff_list], dtype=object)
+    version = np.searchsorted(valid_from, orders["date"].to_numpy(dtype=object), side="right") - 1
+    version = np.clip(version, 0, None)
+    tariff_id = np.array([t[0] for t in tariff_list])[version]
+    rate_nal = np.array([t[3] for t in tariff_list], dtype=float)[version]
+    rate_card = np.array([t[4] for t in tariff_list], dtype=float)[version]
+
+    is_nal = (orders["pay_type"] == money.PAY_NAL).to_numpy()
+    amount = orders["amount"].to_numpy(dtype=np.int64)
+    tips = orders["tips"].to_numpy(dtype=np.int64)
+
+    # округление как money.share: половина копейки — вверх
+    card_share = np.floor(amount * rate_card + 0.5).astype(np.int64)
+    nal_commission = np.floor(amount * (1 - rate_nal) + 0.5).astype(np.int64)
+    final_wo_tips = np.where(is_nal, amount, card_share)
+    commission = np.where(is_nal, nal_commission, amount - card_share)
+
+    orders["tariff_id"] = tariff_id
+    orders["commission"] = commission
+    orders["total"] = final_wo_tips + tips
+    orders["beznal_added"] = np.where(is_nal, -commission, final_wo_tips)
+    return orders
+
+
+# ===== ЗАПИСЬ =====
+def _shift_ids(conn, days) -> dict:
+    """
+    Карта дата -> id смены (первой по id, как при поиске WHERE date = ?).
+
+    Смены ищутся по date_ts через индекс idx_shifts_date_ts.
+    """
+    by_ts = {dates.date_to_epoch(d): d for d in days}
+    stamps = list(by_ts)
+    found = {}
+    for i in range(0, len(stamps), _IN_CHUNK):
+        chunk = stamps[i:i + _IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT date_ts, MIN(id) FROM shifts WHERE date_ts IN ({marks}) GROUP BY date_ts",
+            chunk,
+        ).fetchall()
+        found.update((by_ts[ts], shift_id) for ts, shift_id in rows)
+    return found
+
+
+def resolve_shifts(conn, days) -> dict:
+    """Находит смены по датам, недостающие создаёт одним executemany (закрытыми)."""
+    days = list(days)
+    shift_ids = _shift_ids(conn, days)
+    missing = [d for d in days if d not in shift_ids]
+    if missing:
+        rows = []
+        for d in missing:
+            ts = dates.date_to_epoch(d)
+            rows.append((d, ts, d, ts, d, ts))
+        conn.executemany(
+            "INSERT INTO shifts (date, date_ts, is_open, opened_at, opened_ts, closed_at, closed_ts) "
+            "VALUES (?, ?, 0, ?, ?, ?, ?)",
+            rows,
+        )
+        shift_ids.update(_shift_ids(conn, missing))
+    return shift_ids
+
+
+def write_orders(conn, orders: pd.DataFrame) -> int:
+    """Пишет посчитанные заказы и по записи журнала безнала на каждую дату пачки."""
+    shift_ids = resolve_shifts(conn, orders["date"].unique().tolist())
+    shift_col = orders["date"].map(shift_ids)
+
+    conn.executemany(
+        """
+        INSERT INTO orders (shift_id, pay_type, amount, tips, commission, total, beznal_added, order_time, tariff_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)
+        """,
+        zip(
+            shift_col.tolist(),
+            orders["pay_type"].tolist(),
+            orders["amount"].tolist(),
+            orders["tips"].tolist(),
+            orders["commission"].tolist(),
+            orders["total"].tolist(),
+            orders["beznal_added"].tolist(),
+            orders["tariff_id"].tolist(),
+        ),
+    )
+
+    # запись датируется концом дня заказов, а не временем импорта
+    by_date = orders.groupby("date")["beznal_added"].agg(["sum", "size"])
+    for date_str, beznal, count in by_date.itertuples():
+        ledger.post(
+            conn,
+            ledger.KIND_IMPORT,
+            int(beznal),
+            note=f"заказов: {count}",
+            effective_ts=ledger.day_end(dates.date_to_epoch(date_str)),
+        )
+    return int(orders["beznal_added"].sum())
+
+
+# ===== ПОТОКОВЫЙ ИМПОРТ =====
+def get_import_job(source_key: str):
+    """(rows_done, imported, errors, finished_at) по ключу файла или None."""
+    return db.get_connection().execute(
+        "SELECT rows_done, imported, errors, finished_at "
+        "FROM import_jobs WHERE source_key = ?",
+        (source_key,),
+    ).fetchone()
+
+
+def _save_job(conn, source_key, source_name, rows_done, imported, errors, finished=False):
+    """Сохраняет прогресс: rows_done — абсолютный, imported/errors — прирост."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute(
+        """
+        INSERT INTO import_jobs
+            (source_key, source_name, rows_done, imported, errors, started_at, updated_at, finished_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source_key) DO UPDATE SET
+            rows_done = excluded.rows_done,
+            imported = import_jobs.imported + excluded.imported,
+            errors = import_jobs.errors + excluded.errors,
+            updated_at = excluded.updated_at,
+            finished_at = excluded.finished_at
+        """,
+        (
+            source_key,
+            source_name,
+            rows_done,
+            imported,
+            errors,
+            now,
+            now,
+            now if finished else None,
+        ),
+    )
+
+
+def import_orders_stream(
+    chunks,
+    source_key: str | None = None,
+    source_name: str = "",
+    resume: bool = True,
+    progress=None,
+) -> dict:
+    """
+    Импортирует заказы порциями: каждая порция — отдельная транзакция.
+
+    chunks — итератор DataFrame со сквозной нумерацией строк. Если задан
+    source_key, после каждой порции в import_jobs (в той же транзакции)
+    сохраняется число обработанных строк, и при resume=True повторный
+    запуск пропускает уже закоммиченные строки. progress(stats) вызывается
+    после каждой порции.
+
+    Возвращает stats: imported, error_count, errors (первые
+    MAX_KEPT_ERRORS сообщений), beznal_delta, rows_done, resumed_from.
+    """
+    resumed_from = 0
+    if source_key:
+        job = get_import_job(source_key)
+        if job and resume:
+            resumed_from = job[0]
+        elif job:
+            with db.transaction() as conn:
+                conn.execute(
+                    "DELETE FROM import_jobs WHERE source_key = ?", (source_key,)
+                )
+
+    stats = {
+        "imported": 0,
+        "error_count": 0,
+        "errors": [],
+        "beznal_delta": 0,
+        "rows_done": resumed_from,
+        "resumed_from": resumed_from,
+    }
+
+    tariff_list = tariffs.list_tariffs()
+    start = 0
+    for chunk in chunks:
+        end = start + len(chunk)
+        if end <= resumed_from:
+            start = end
+            continue
+        if start < resumed_from:
+            chunk = chunk.iloc[resumed_from - start:]
+
+        orders, errors = parse_orders(drop_empty_amounts(chunk))
+        compute_amounts(orders, tariff_list)
+        with db.transaction() as conn:
+            beznal_delta = write_orders(conn, orders) if not orders.empty else 0
+            if source_key:
+                _save_job(conn, source_key, source_name, end, len(orders), len(errors))
+
+        stats["imported"] += len(orders)
+        stats["beznal_delta"] += beznal_delta
+        stats["error_count"] += len(errors)
+        stats["errors"].extend(errors[:MAX_KEPT_ERRORS - len(stats["errors"])])
+        stats["rows_done"] = end
+
+        start = end
+        if progress is not None:
+            progress(stats)
+
+    if source_key:
+        with db.transaction() as conn:
+            _save_job(conn, source_key, source_name, stats["rows_done"], 0, 0, finished=True)
+    return stats
@@ -0,0 +1,266 @@
+"""
+Необязательная инструментовка: время секций страниц и SQL-запросов.
+
+Выключена по умолчанию и ничего не стоит, пока выключена. Включается
+переменной окружения TAXI_INSTRUMENT=1 или set_enabled(True) (переключатель
+в админке). Тогда taxi.db открывает соединения с InstrumentedConnection:
+
+- каждый execute/executemany и выборка его строк (fetch*) засчитываются
+  запросу — число вызовов, суммарное и максимальное время;
+- set_progress_handler считает шаги VM SQLite, потраченные запросом;
+- set_trace_callback считает все выполненные SQLite операторы, включая
+  операторы внутри триггеров;
+- запросы дольше SLOW_MS попадают в кольцевой журнал; EXPLAIN QUERY PLAN
+  для них строится при показе (snapshot), отдельным соединением.
+
+section(name) замеряет блок страницы. Статистика общая на процесс.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SLOW_MS = 20.0
+SLOW_LOG_SIZE = 50
+PROGRESS_STEPS = 1000
+
+_enabled = os.environ.get("TAXI_INSTRUMENT") == "1"
+_lock = threading.Lock()
+_local = threading.local()
+
+_statements = {}   # текст запроса -> {"calls", "seconds", "max_s", "vm_steps"}
+_sections = {}     # секция -> {"calls", "seconds", "max_s", "last_s"}
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_traced = {"statements": 0}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    """
+    Включает/выключает сбор. Соединения не закрываются: каждый поток
+    переоткроет своё с нужной фабрикой вне транзакции (db.invalidate_connections).
+    """
+    global _enabled
+    if flag == _enabled:
+        return
+    _enabled = flag
+    from taxi import db
+
+    db.invalidate_connections()
+
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _sections.clear()
+        _slow.clear()
+        _traced["statements"] = 0
+
+
+def _normalize(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+# ===== SQL =====
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, который засчитывает своему запросу время execute и fetch*."""
+
+    _record = None
+    _slow_entry = None
+    _elapsed = 0.0
+
+    @contextmanager
+    def _measure(self, count: bool = False):
+        record = self._record
+        _local.record = record
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            _local.record = None
+            with _lock:
+                record["seconds"] += elapsed
+                if count:
+                    record["calls"] += 1
+                    self._elapsed = 0.0
+                self._elapsed += elapsed
+                record["max_s"] = max(record["max_s"], self._elapsed)
+                if self._elapsed * 1000 >= SLOW_MS:
+                    if self._slow_entry is None:
+                        self._slow_entry = {
+                            "at": time.strftime("%H:%M:%S"),
+                            "sql": self._sql,
+                            "params": self._params,
+                            "ms": 0.0,
+                            "plan": None,
+                        }
+                        _slow.append(self._slow_entry)
+                    self._slow_entry["ms"] = self._elapsed * 1000
+
+    def _start(self, sql: str, params):
+        self._sql = _normalize(sql)
+        self._params = params
+        self._slow_entry = None
+        with _lock:
+            self._record = _statements.setdefault(
+                self._sql, {"calls": 0, "seconds": 0.0, "max_s": 0.0, "vm_steps": 0}
+            )
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        with self._measure(count=True):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        with self._measure(count=True):
+            return super().executemany(sql, seq_of_parameters)
+
+    def fetchone(self):
+        if self._record is None:
+            return super().fetchone()
+        with self._measure():
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        if self._record is None:
+            return super().fetchmany(size or self.arraysize)
+        with self._measure():
+            return super().fetchmany(size or self.arraysize)
+
+    def fetchall(self):
+        if self._record is None:
+            return super().fetchall()
+        with self._measure():
+            return super().fetchall()
+
+    def __next__(self):
+        if self._record is None:
+            return super().__next__()
+        with self._measure():
+            return super().__next__()
+
+
+def _on_progress():
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record["vm_steps"] += PROGRESS_STEPS
+    return 0
+
+
+def _on_trace(_statement):
+    with _lock:
+        _traced["statements"] += 1
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого идут через InstrumentedCursor."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_progress_handler(_on_progress, PROGRESS_STEPS)
+        self.set_trace_callback(_on_trace)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Фабрика для sqlite3.connect: InstrumentedConnection или обычная."""
+    return InstrumentedConnection if _enabled else sqlite3.Connection
+
+
+# ===== СЕКЦИИ СТРАНИЦ =====
+@contextmanager
+def section(name: str):
+    """Замеряет блок страницы; без включённой инструментовки — пустой блок."""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            stats = _sections.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "max_s": 0.0, "last_s": 0.0}
+            )
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+            stats["last_s"] = elapsed
+
+
+# ===== ОТЧЁТ =====
+def _explain(conn, sql: str, params):
+    """Строки EXPLAIN QUERY PLAN или текст ошибки (например, для DDL)."""
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [str(e)]
+    return [detail for _, _, _, detail in rows]
+
+
+def snapshot(db_path: str) -> dict:
+    """
+    Копия собранной статистики для показа.
+
+    {"enabled", "statements": [(sql, calls, seconds, max_s, vm_steps)] по
+    убыванию времени, "sections": [(name, calls, seconds, max_s, last_s)],
+    "slow": [{"at", "sql", "ms", "plan"}], "traced"}. Планы медленных
+    запросов строятся здесь, отдельным неинструментованным соединением.
+    """
+    with _lock:
+        statements = sorted(
+            (
+                (sql, s["calls"], s["seconds"], s["max_s"], s["vm_steps"])
+                for sql, s in _statements.items()
+            ),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+        sections = sorted(
+            (
+                (name, s["calls"], s["seconds"], s["max_s"], s["last_s"])
+                for name, s in _sections.items()
+            ),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+        slow = list(_slow)
+        traced = _traced["statements"]
+
+    pending = [entry for entry in slow if entry["plan"] is None]
+    if pending:
+        conn = sqlite3.connect(db_path)
+        try:
+            for entry in pending:
+                entry["plan"] = _explain(conn, entry["sql"], entry["params"])
+        finally:
+            conn.close()
+
+    return {
+        "enabled": _enabled,
+        "statements": statements,
+        "sections": sections,
+        "slow": [
+            {"at": e["at"], "sql": e["sql"], "ms": e["ms"], "plan": e["plan"]}
+            for e in reversed(slow)
+        ],
+        "traced": traced,
+    }
@@ -0,0 +1,207 @@
+"""
+Журнал накопленного безнала (только дописывается).
+
+Каждое изменение баланса — отдельная запись beznal_ledger: заказ, импорт,
+ручная корректировка, пересчёт, смена тарифа. Каждые SNAPSHOT_EVERY
+записей сохраняется снимок баланса, поэтому текущий баланс — это
+последний снимок плюс сумма «хвоста» после него.
+
+У записи два времени: created_at — когда она записана, effective_ts —
+к какому моменту относится (epoch-секунды, см. taxi.dates). Записи по
+заказам датируются моментом заказа, а импорт, смена тарифа и пересчёт
+пишут по записи на день заказов с концом этого дня, поэтому баланс на
+прошлую дату (balance_at) считается по effective_ts: история не
+съезжает на день импорта или пересчёта.
+Суммы — целые копейки (см. taxi.money).
+"""
+
+from datetime import datetime
+
+from taxi import dates, db
+
+SNAPSHOT_EVERY = 500
+
+# виды записей
+KIND_INITIAL = "initial"   # перенос старого баланса
+KIND_ORDER = "order"       # заказ из приложения
+KIND_IMPORT = "import"     # пачка импортированных заказов
+KIND_MANUAL = "manual"     # ручная корректировка в админке
+KIND_RECALC = "recalc"     # выравнивание после пересчёта базы
+KIND_TARIFF = "tariff"     # пересчёт окна при смене тарифа
+
+# записи, которые по дням совпадают с beznal_added заказов; перенос
+# и ручные корректировки к заказам не привязаны
+ORDER_KINDS = (KIND_ORDER, KIND_IMPORT, KIND_TARIFF, KIND_RECALC)
+ORDER_KINDS_SQL = ", ".join(f"'{kind}'" for kind in ORDER_KINDS)
+
+# момент заказа o смены s для журнала: ordered_at, без времени — конец дня смены
+ORDER_MOMENT_SQL = f"COALESCE(o.ordered_at, s.date_ts + {dates.DAY - 1})"
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def day_end(ts: int) -> int:
+    """Последняя секунда дня, в который попадает ts."""
+    return ts - ts % dates.DAY + dates.DAY - 1
+
+
+def _last_snapshot(conn):
+    """(ledger_id, balance) последнего снимка или (0, 0)."""
+    row = conn.execute(
+        "SELECT ledger_id, balance FROM beznal_snapshots ORDER BY ledger_id DESC LIMIT 1"
+    ).fetchone()
+    return row if row else (0, 0)
+
+
+def _balance(conn) -> int:
+    snap_id, snap_balance = _last_snapshot(conn)
+    tail = conn.execute(
+        "SELECT COALESCE(SUM(amount), 0) FROM beznal_ledger WHERE id > ?",
+        (snap_id,),
+    ).fetchone()[0]
+    return snap_balance + tail
+
+
+# ===== ЗАПИСЬ =====
+def post(conn, kind: str, amount: int, order_id=None, note=None, created_at=None,
+         effective_ts=None):
+    """
+    Дописывает запись в журнал внутри транзакции вызывающего.
+
+    effective_ts — момент, к которому относится запись (по умолчанию —
+    сейчас). Нулевые суммы не пишутся. Возвращает id записи или None.
+    """
+    if not amount:
+        return None
+    created_at = created_at or _now()
+    if effective_ts is None:
+        effective_ts = dates.now_epoch()
+    entry_id = conn.execute(
+        """
+        INSERT INTO beznal_ledger (created_at, effective_ts, kind, amount, order_id, note)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (created_at, effective_ts, kind, amount, order_id, note),
+    ).lastrowid
+
+    snap_id, _ = _last_snapshot(conn)
+    if entry_id - snap_id >= SNAPSHOT_EVERY:
+        conn.execute(
+            "INSERT INTO beznal_snapshots (ledger_id, created_at, balance) VALUES (?, ?, ?)",
+            (entry_id, created_at, _balance(conn)),
+        )
+    return entry_id
+
+
+def post_many(conn, entries):
+    """entries: [(kind, amount, order_id, effective_ts)] одним временем записи."""
+    created_at = _now()
+    for kind, amount, order_id, effective_ts in entries:
+        post(
+            conn, kind, amount, order_id=order_id, created_at=created_at,
+            effective_ts=effective_ts,
+        )
+
+
+def align_to_orders(conn, kind: str, start_ts=None, end_ts=None, note=None) -> int:
+    """
+    Выравнивает журнал по заказам за дни [start_ts, end_ts) (None — без границы).
+
+    Для каждого дня, где записи ORDER_KINDS в сумме расходятся с
+    beznal_added заказов этого дня, дописывает разницу записью kind с
+    концом дня. Возвращает сумму дописанных записей.
+    """
+    params = {"start": start_ts, "end": end_ts}
+    day = dates.DAY
+    by_orders = dict(
+        conn.execute(
+            f"""
+            SELECT moment - moment % {day}, SUM(beznal_added)
+            FROM (
+                SELECT {ORDER_MOMENT_SQL} AS moment, o.beznal_added
+                FROM orders o
+                JOIN shifts s ON s.id = o.shift_id
+                WHERE (:start IS NULL OR s.date_ts > :start - {2 * day})
+                  AND (:end IS NULL OR s.date_ts < :end)
+            )
+            WHERE (:start IS NULL OR moment >= :start)
+              AND (:end IS NULL OR moment < :end)
+            GROUP BY 1
+            """,
+            params,
+        ).fetchall()
+    )
+    by_ledger = dict(
+        conn.execute(
+            f"""
+            SELECT effective_ts - effective_ts % {day}, SUM(amount)
+            FROM beznal_ledger
+            WHERE (:start IS NULL OR effective_ts >= :start)
+              AND (:end IS NULL OR effective_ts < :end)
+              AND kind IN ({ORDER_KINDS_SQL})
+            GROUP BY 1
+            """,
+            params,
+        ).fetchall()
+    )
+    posted = 0
+    for day_ts in sorted(by_orders.keys() | by_ledger.keys()):
+        delta = by_orders.get(day_ts, 0) - by_ledger.get(day_ts, 0)
+        if delta:
+            post(conn, kind, delta, note=note, effective_ts=day_end(day_ts))
+            posted += delta
+    return posted
+
+
+def set_balance(conn, balance: int, kind: str = KIND_MANUAL, note=None) -> int:
+    """Приводит баланс к значению корректирующей записью, возвращает её сумму."""
+    delta = balance - _balance(conn)
+    post(conn, kind, delta, note=note)
+    return delta
+
+
+def correct_balance(balance: int, note=None) -> int:
+    """Ручная корректировка баланса в своей транзакции, возвращает сумму записи."""
+    with db.transaction() as conn:
+        return set_balance(conn, balance, note=note)
+
+
+# ===== ЧТЕНИЕ =====
+def current_balance() -> int:
+    """Текущий накопленный безнал: снимок + хвост журнала."""
+    return _balance(db.get_connection())
+
+
+def balance_at(moment: str) -> int:
+    """
+    Баланс на момент moment ("ГГГГ-ММ-ДД" или "ГГГГ-ММ-ДД ЧЧ:ММ:СС").
+
+    Считается по effective_ts (момент заказа или день, к которому
+    относится запись), а не по времени записи. Дата без времени означает
+    конец дня. Текущий баланс минус записи после момента — по индексу
+    idx_ledger_effective, без чтения всего журнала.
+    """
+    moment_ts = dates.to_epoch(dates.parse_datetime(moment))
+    if len(moment) == 10:
+        moment_ts = day_end(moment_ts)
+    conn = db.get_connection()
+    later = conn.execute(
+        "SELECT COALESCE(SUM(amount), 0) FROM beznal_ledger WHERE effective_ts > ?",
+        (moment_ts,),
+    ).fetchone()[0]
+    return _balance(conn) - later
+
+
+def last_entries(limit: int = 20):
+    """[(id, created_at, kind, amount, order_id, note)] — последние записи."""
+    return db.get_connection().execute(
+        """
+        SELECT id, created_at, kind, amount, order_id, note
+        FROM beznal_ledger
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
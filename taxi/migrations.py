@@ -0,0 +1,545 @@
+"""
+Версионированная схема БД.
+
+Текущая версия хранится в PRAGMA user_version. Каждая миграция выполняется
+в своей транзакции вместе с записью нового номера версии, поэтому
+прерванная миграция не оставляет схему в промежуточном состоянии.
+"""
+
+import threading
+from datetime import datetime
+
+from taxi import cube, dates, db, ledger, money, summary, tariffs
+
+
+def _column_names(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+# ===== МИГРАЦИИ =====
+def _v1_base_schema(conn):
+    """Исходные таблицы shifts / orders / accumulated_beznal."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            km INTEGER DEFAULT 0,
+            fuel_liters REAL DEFAULT 0,
+            fuel_price REAL DEFAULT 0,
+            is_open INTEGER DEFAULT 1,
+            opened_at TEXT,
+            closed_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shift_id INTEGER,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            tips REAL DEFAULT 0,
+            commission REAL NOT NULL,
+            total REAL NOT NULL,
+            beznal_added REAL DEFAULT 0,
+            order_time TEXT
+        )
+        """
+    )
+    # на случай старой таблицы без order_time
+    if "order_time" not in _column_names(conn, "orders"):
+        conn.execute("ALTER TABLE orders ADD COLUMN order_time TEXT")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS accumulated_beznal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER DEFAULT 1,
+            total_amount REAL DEFAULT 0,
+            last_updated TEXT
+        )
+        """
+    )
+    row = conn.execute(
+        "SELECT id FROM accumulated_beznal WHERE driver_id = 1"
+    ).fetchone()
+    if not row:
+        conn.execute(
+            "INSERT INTO accumulated_beznal "
+            "(driver_id, total_amount, last_updated) "
+            "VALUES (1, 0, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),),
+        )
+
+
+def _v2_indexes(conn):
+    """Индексы под основные пути доступа."""
+    # заказы смены и агрегаты по ним читаются только из индекса
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_shift
+        ON orders (shift_id, type, total, tips, beznal_added)
+        """
+    )
+    # смены по дате (диапазон месяца, конкретный день) среди закрытых;
+    # индекс только по date, составного (date, id) здесь нет
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_shifts_closed_date
+        ON shifts (date) WHERE is_open = 0
+        """
+    )
+    # открытая смена — одна строка, частичный индекс почти пустой
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_shifts_open ON shifts (date) WHERE is_open = 1"
+    )
+
+
+def _v3_import_jobs(conn):
+    """Прогресс потокового импорта: сколько строк файла уже закоммичено."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_key TEXT NOT NULL UNIQUE,
+            source_name TEXT,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT,
+            updated_at TEXT,
+            finished_at TEXT
+        )
+        """
+    )
+
+
+def _v4_tariffs(conn):
+    """Версии тарифа с датами действия; заказ помнит, по какой посчитан."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tariffs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rate_nal REAL NOT NULL,
+            rate_card REAL NOT NULL,
+            valid_from TEXT NOT NULL UNIQUE,
+            valid_to TEXT,
+            created_at TEXT
+        )
+        """
+    )
+    base_id = conn.execute(
+        "INSERT INTO tariffs (rate_nal, rate_card, valid_from, valid_to, created_at) "
+        "VALUES (?, ?, ?, NULL, ?)",
+        (
+            tariffs.DEFAULT_RATE_NAL,
+            tariffs.DEFAULT_RATE_CARD,
+            tariffs.MIN_DATE,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        ),
+    ).lastrowid
+    if "tariff_id" not in _column_names(conn, "orders"):
+        conn.execute("ALTER TABLE orders ADD COLUMN tariff_id INTEGER")
+    # вся существующая история посчитана по единственному тарифу
+    conn.execute("UPDATE orders SET tariff_id = ?", (base_id,))
+
+
+def _v5_shift_summary(conn):
+    """Итоги смен, которые поддерживают триггеры на orders."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shift_summary (
+            shift_id INTEGER PRIMARY KEY,
+            nal REAL NOT NULL DEFAULT 0,
+            card REAL NOT NULL DEFAULT 0,
+            tips REAL NOT NULL DEFAULT 0,
+            beznal REAL NOT NULL DEFAULT 0,
+            orders_count INTEGER NOT NULL DEFAULT 0,
+            first_order_time TEXT,
+            last_order_time TEXT
+        )
+        """
+    )
+    summary.create_summary_triggers(conn, summary.PAY_TEXT)
+    summary.rebuild_shift_summary(conn, summary.PAY_TEXT)
+
+
+def _v6_beznal_ledger(conn):
+    """Журнал безнала со снимками вместо изменяемой строки accumulated_beznal."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS beznal_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            amount REAL NOT NULL,
+            order_id INTEGER,
+            note TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS beznal_snapshots (
+            ledger_id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            balance REAL NOT NULL
+        )
+        """
+    )
+    # снимки ищутся по времени для balance_at()
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_snapshots_created ON beznal_snapshots (created_at)"
+    )
+    row = conn.execute(
+        "SELECT total_amount, last_updated FROM accumulated_beznal WHERE driver_id = 1"
+    ).fetchone()
+    # не через ledger.post: колонки effective_ts на этой версии ещё нет
+    if row and row[0]:
+        conn.execute(
+            "INSERT INTO beznal_ledger (created_at, kind, amount, note) VALUES (?, ?, ?, ?)",
+            (
+                row[1] or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                ledger.KIND_INITIAL,
+                row[0],
+                "перенос из accumulated_beznal",
+            ),
+        )
+    conn.execute("DROP TABLE accumulated_beznal")
+
+
+def _v7_epoch_times(conn):
+    """Целые epoch-колонки для дат смен и моментов заказов с переносом из текста."""
+    for table, column in (
+        ("shifts", "date_ts"),
+        ("shifts", "opened_ts"),
+        ("shifts", "closed_ts"),
+        ("orders", "ordered_at"),
+    ):
+        if column not in _column_names(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+
+    shifts = conn.execute("SELECT id, date, opened_at, closed_at FROM shifts").fetchall()
+    updates = []
+    for shift_id, date_text, opened_at, closed_at in shifts:
+        date_str = dates.parse_date(date_text)
+        opened = dates.parse_datetime(opened_at)
+        closed = dates.parse_datetime(closed_at)
+        updates.append(
+            (
+                date_str or date_text,
+                dates.date_to_epoch(date_str) if date_str else None,
+                dates.to_epoch(opened) if opened else None,
+                dates.to_epoch(closed) if closed else None,
+                shift_id,
+            )
+        )
+    conn.executemany(
+        "UPDATE shifts SET date = ?, date_ts = ?, opened_ts = ?, closed_ts = ? WHERE id = ?",
+        updates,
+    )
+
+    rows = conn.execute(
+        """
+        SELECT o.id, s.date, o.order_time, s.opened_at
+        FROM orders o
+        JOIN shifts s ON s.id = o.shift_id
+        WHERE o.order_time IS NOT NULL
+        """
+    ).fetchall()
+    conn.executemany(
+        "UPDATE orders SET ordered_at = ? WHERE id = ?",
+        [
+            (dates.order_epoch(date_str, order_time, opened_at), order_id)
+            for order_id, date_str, order_time, opened_at in rows
+        ],
+    )
+
+    # диапазоны дат закрытых смен — по целой колонке
+    conn.execute("DROP INDEX IF EXISTS idx_shifts_closed_date")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_shifts_closed_ts ON shifts (date_ts) WHERE is_open = 0"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_orders_ordered_at ON orders (ordered_at) "
+        "WHERE ordered_at IS NOT NULL"
+    )
+
+
+def _kopecks(column: str) -> str:
+    """SQL: рубли REAL -> целые копейки с округлением до ближайшей."""
+    return f"CAST(ROUND(COALESCE({column}, 0) * {money.KOPECKS}) AS INTEGER)"
+
+
+def _v8_kopecks_strict(conn):
+    """
+    Деньги — INTEGER копейки, тип оплаты — pay_type 0/1, таблицы STRICT.
+
+    STRICT-таблицы не меняются через ALTER, поэтому orders, shift_summary
+    и журнал безнала пересоздаются с копированием данных; индексы и
+    триггеры создаются заново.
+    """
+    for trigger in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_orders_summary_{trigger}")
+
+    conn.execute(
+        f"""
+        CREATE TABLE orders_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shift_id INTEGER,
+            pay_type INTEGER NOT NULL CHECK (pay_type IN ({money.PAY_NAL}, {money.PAY_CARD})),
+            amount INTEGER NOT NULL,
+            tips INTEGER NOT NULL DEFAULT 0,
+            commission INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            beznal_added INTEGER NOT NULL DEFAULT 0,
+            order_time TEXT,
+            ordered_at INTEGER,
+            tariff_id INTEGER
+        ) STRICT
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO orders_new
+            (id, shift_id, pay_type, amount, tips, commission, total, beznal_added,
+             order_time, ordered_at, tariff_id)
+        SELECT
+            id,
+            shift_id,
+            CASE WHEN type = 'карта' THEN {money.PAY_CARD} ELSE {money.PAY_NAL} END,
+            {_kopecks("amount")},
+            {_kopecks("tips")},
+            {_kopecks("commission")},
+            {_kopecks("total")},
+            {_kopecks("beznal_added")},
+            order_time,
+            ordered_at,
+            tariff_id
+        FROM orders
+        """
+    )
+    conn.execute("DROP TABLE orders")
+    conn.execute("ALTER TABLE orders_new RENAME TO orders")
+    conn.execute(
+        """
+        CREATE INDEX idx_orders_shift
+        ON orders (shift_id, pay_type, total, tips, beznal_added)
+        """
+    )
+    conn.execute(
+        "CREATE INDEX idx_orders_ordered_at ON orders (ordered_at) "
+        "WHERE ordered_at IS NOT NULL"
+    )
+
+    conn.execute("DROP TABLE shift_summary")
+    conn.execute(
+        """
+        CREATE TABLE shift_summary (
+            shift_id INTEGER PRIMARY KEY,
+            nal INTEGER NOT NULL DEFAULT 0,
+            card INTEGER NOT NULL DEFAULT 0,
+            tips INTEGER NOT NULL DEFAULT 0,
+            beznal INTEGER NOT NULL DEFAULT 0,
+            orders_count INTEGER NOT NULL DEFAULT 0,
+            first_order_time TEXT,
+            last_order_time TEXT
+        ) STRICT
+        """
+    )
+    summary.create_summary_triggers(conn)
+    summary.rebuild_shift_summary(conn)
+
+    conn.execute(
+        """
+        CREATE TABLE beznal_ledger_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            order_id INTEGER,
+            note TEXT
+        ) STRICT
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO beznal_ledger_new (id, created_at, kind, amount, order_id, note)
+        SELECT id, created_at, kind, {_kopecks("amount")}, order_id, note
+        FROM beznal_ledger
+        """
+    )
+    conn.execute("DROP TABLE beznal_ledger")
+    conn.execute("ALTER TABLE beznal_ledger_new RENAME TO beznal_ledger")
+
+    # балансы снимков пересчитываются по уже округлённым записям
+    conn.execute(
+        """
+        CREATE TABLE beznal_snapshots_new (
+            ledger_id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            balance INTEGER NOT NULL
+        ) STRICT
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO beznal_snapshots_new (ledger_id, created_at, balance)
+        SELECT
+            s.ledger_id,
+            s.created_at,
+            (SELECT COALESCE(SUM(l.amount), 0) FROM beznal_ledger l WHERE l.id <= s.ledger_id)
+        FROM beznal_snapshots s
+        """
+    )
+    conn.execute("DROP TABLE beznal_snapshots")
+    conn.execute("ALTER TABLE beznal_snapshots_new RENAME TO beznal_snapshots")
+    conn.execute(
+        "CREATE INDEX idx_snapshots_created ON beznal_snapshots (created_at)"
+    )
+
+
+def _v9_earnings_cube(conn):
+    """Куб «день × час × тип оплаты», который ведут триггеры на orders."""
+    conn.execute(
+        """
+        CREATE TABLE earnings_cube (
+            day INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            pay_type INTEGER NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            gross INTEGER NOT NULL DEFAULT 0,
+            net INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour, pay_type)
+        ) STRICT, WITHOUT ROWID
+        """
+    )
+    cube.create_cube_triggers(conn)
+    cube.rebuild_cube(conn)
+
+
+def _v10_ledger_effective(conn):
+    """
+    Момент, к которому относится запись журнала (effective_ts), для balance_at.
+
+    Записи заказов получают момент заказа, остальные — время записи. Суммы
+    переноса и импортов, записанные днём миграции или импорта, раскладываются
+    по дням заказов; остаток, не объяснённый заказами, остаётся в переносе —
+    текущий баланс не меняется.
+    """
+    conn.execute(
+        "ALTER TABLE beznal_ledger ADD COLUMN effective_ts INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.execute(
+        f"""
+        UPDATE beznal_ledger SET effective_ts = COALESCE(
+            (
+                SELECT {ledger.ORDER_MOMENT_SQL}
+                FROM orders o
+                JOIN shifts s ON s.id = o.shift_id
+                WHERE o.id = beznal_ledger.order_id
+            ),
+            CAST(strftime('%s', created_at) AS INTEGER),
+            CAST(strftime('%s', 'now', 'localtime') AS INTEGER)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX idx_ledger_effective ON beznal_ledger (effective_ts, kind, amount)"
+    )
+    # balance_at больше не ищет снимки по времени
+    conn.execute("DROP INDEX IF EXISTS idx_snapshots_created")
+
+    moved = ledger.align_to_orders(conn, ledger.KIND_RECALC, note="по датам заказов")
+    initial = conn.execute(
+        "SELECT effective_ts FROM beznal_ledger WHERE kind = ? ORDER BY id LIMIT 1",
+        (ledger.KIND_INITIAL,),
+    ).fetchone()
+    ledger.post(
+        conn,
+        ledger.KIND_INITIAL,
+        -moved,
+        note="разложено по датам заказов",
+        effective_ts=initial[0] if initial else None,
+    )
+
+
+def _v11_shifts_date_index(conn):
+    """Индекс по дате смены без условия is_open — для поиска смен по датам при импорте."""
+    conn.execute("CREATE INDEX idx_shifts_date_ts ON shifts (date_ts, id)")
+
+
+def _v12_summary_drop_order_times(conn):
+    """
+    Убирает first_order_time/last_order_time из shift_summary.
+
+    Это MIN/MAX по тексту "ЧЧ:ММ", который для смены через полночь путает
+    первый и последний заказ; поля никто не читает, а моменты заказов
+    есть в orders.ordered_at. Триггеры пересоздаются без них.
+    """
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_orders_summary_{trigger}")
+    conn.execute("ALTER TABLE shift_summary DROP COLUMN first_order_time")
+    conn.execute("ALTER TABLE shift_summary DROP COLUMN last_order_time")
+    summary.create_summary_triggers(conn)
+
+
+MIGRATIONS = [
+    (1, _v1_base_schema),
+    (2, _v2_indexes),
+    (3, _v3_import_jobs),
+    (4, _v4_tariffs),
+    (5, _v5_shift_summary),
+    (6, _v6_beznal_ledger),
+    (7, _v7_epoch_times),
+    (8, _v8_kopecks_strict),
+    (9, _v9_earnings_cube),
+    (10, _v10_ledger_effective),
+    (11, _v11_shifts_date_index),
+    (12, _v12_summary_drop_order_times),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# ===== ЗАПУСК =====
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate() -> int:
+    """Применяет недостающие миграции, возвращает итоговую версию схемы."""
+    conn = db.get_connection()
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    for version, apply in MIGRATIONS:
+        with db.transaction() as conn:
+            # перечитываем под блокировкой: другой процесс мог успеть раньше
+            if get_schema_version(conn) >= version:
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+    return get_schema_version(conn)
+
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def ensure_schema():
+    """Проверяет схему один раз на процесс (для каждого файла БД)."""
+    if db.DB_NAME in _migrated:
+        return
+    with _migrate_lock:
+        if db.DB_NAME not in _migrated:
+            migrate()
+            _migrated.add(db.DB_NAME)
+
+
+def reset_database() -> int:
+    """Удаляет файл БД и создаёт пустую схему заново."""
+    db.remove_db_files()
+    return migrate()
@@ -0,0 +1,46 @@
+"""
+Деньги в копейках и тип оплаты как небольшое целое.
+
+В БД все суммы — INTEGER копейки, поэтому SUM точный и не копит ошибку
+округления. Перевод в рубли и форматирование — только при показе
+(app.py, страницы), расчёты и запись идут в копейках.
+"""
+
+import math
+
+KOPECKS = 100
+
+# тип оплаты в orders.pay_type
+PAY_NAL = 0
+PAY_CARD = 1
+PAY_NAMES = {PAY_NAL: "нал", PAY_CARD: "карта"}
+PAY_CODES = {name: code for code, name in PAY_NAMES.items()}
+
+
+def to_kopecks(rubles) -> int:
+    """Рубли (float/str с точкой) -> целые копейки, округление до ближайшей."""
+    return int(round(float(rubles) * KOPECKS))
+
+
+def to_rub(kopecks) -> float:
+    return (kopecks or 0) / KOPECKS
+
+
+def share(kopecks: int, rate: float) -> int:
+    """
+    Доля суммы в копейках, округлённая половиной вверх.
+
+    Для неотрицательных сумм совпадает с CAST(x * rate + 0.5 AS INTEGER)
+    в SQL и с np.floor(x * rate + 0.5) при векторном импорте.
+    """
+    return int(math.floor(kopecks * rate + 0.5))
+
+
+def fmt_amount(kopecks, digits: int = 0) -> str:
+    """Сумма в рублях без знака валюты, для таблиц."""
+    return f"{to_rub(kopecks):.{digits}f}"
+
+
+def fmt_rub(kopecks, digits: int = 0) -> str:
+    """Сумма в рублях со знаком ₽."""
+    return f"{fmt_amount(kopecks, digits)} ₽"
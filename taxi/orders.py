@@ -0,0 +1,63 @@
+"""
+Запись заказов смены.
+
+Заказ, его запись в журнале безнала и сводка смены (триггеры на orders)
+пишутся в одной транзакции — один коммит на пачку заказов, и баланс не
+может разойтись с заказами при сбое между шагами.
+"""
+
+from taxi import dates, db, ledger, tariffs
+
+
+def add_orders(shift_id: int, orders) -> list:
+    """
+    Добавляет пачку заказов в смену одной транзакцией.
+
+    orders: [(pay_type, amount, tips, order_time)], суммы в копейках.
+    Тариф выбирается по дате смены, момент заказа (ordered_at) — по дате
+    смены и order_time с учётом перехода через полночь.
+    Возвращает [(order_id, commission, total, beznal_added)].
+    """
+    with db.transaction() as conn:
+        date_str, opened_at = conn.execute(
+            "SELECT date, opened_at FROM shifts WHERE id = ?", (shift_id,)
+        ).fetchone()
+        tariff_id, rate_nal, rate_card = tariffs.get_tariff(date_str)
+
+        results = []
+        entries = []
+        for pay_type, amount, tips, order_time in orders:
+            commission, total, beznal_added = tariffs.calc_order(
+                pay_type, amount, tips, rate_nal, rate_card
+            )
+            ordered_at = dates.order_epoch(date_str, order_time, opened_at)
+            order_id = conn.execute(
+                """
+                INSERT INTO orders (shift_id, pay_type, amount, tips, commission, total, beznal_added, order_time, ordered_at, tariff_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    shift_id,
+                    pay_type,
+                    amount,
+                    tips,
+                    commission,
+                    total,
+                    beznal_added,
+                    order_time,
+                    ordered_at,
+                    tariff_id,
+                ),
+            ).lastrowid
+            results.append((order_id, commission, total, beznal_added))
+            if ordered_at is None:
+                ordered_at = ledger.day_end(dates.date_to_epoch(date_str))
+            entries.append((ledger.KIND_ORDER, beznal_added, order_id, ordered_at))
+
+        ledger.post_many(conn, entries)
+    return results
+
+
+def add_order(shift_id: int, pay_type: int, amount: int, tips: int, order_time: str):
+    """Один заказ: (order_id, commission, total, beznal_added)."""
+    return add_orders(shift_id, [(pay_type, amount, tips, order_time)])[0]
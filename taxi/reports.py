@@ -0,0 +1,247 @@
+"""
+Отчёты за произвольный период с группировкой по дню, ISO-неделе, месяцу
+или году.
+
+Итоги считаются одним сгруппированным запросом по закрытым сменам
+(shift_summary + shifts), нарастающие итоги — оконными функциями в том же
+запросе. Деньги — копейки, как в остальных таблицах.
+
+Экономика смены считается там же: бензин (литры × цена), чистая прибыль
+(нал + карта + чаевые − бензин), прибыль на км и в час (по opened_ts и
+closed_ts). Средние за период — отношение сумм, а не среднее по сменам,
+и учитывают только смены, где известны км или время.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+
+from taxi import dates, db, money
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ключ корзины по shifts.date_ts; неделя — понедельник ISO-недели
+BUCKET_SQL = {
+    "day": "date(s.date_ts, 'unixepoch')",
+    "week": "date(s.date_ts, 'unixepoch', '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m', s.date_ts, 'unixepoch')",
+    "year": "strftime('%Y', s.date_ts, 'unixepoch')",
+}
+
+FUEL_COST_SQL = (
+    f"CAST(ROUND(COALESCE(s.fuel_liters, 0) * COALESCE(s.fuel_price, 0) * {money.KOPECKS})"
+    " AS INTEGER)"
+)
+
+# одна строка на закрытую смену за [:start, :end) с её экономикой; смена без
+# заказов (нет строки shift_summary) остаётся — её бензин входит в прибыль
+SHIFT_METRICS_SQL = f"""
+    SELECT
+        s.id AS shift_id,
+        s.date AS date,
+        s.date_ts AS date_ts,
+        {{bucket}} AS bucket,
+        COALESCE(ss.orders_count, 0) AS orders,
+        COALESCE(ss.nal, 0) AS nal,
+        COALESCE(ss.card, 0) AS card,
+        COALESCE(ss.tips, 0) AS tips,
+        COALESCE(ss.beznal, 0) AS beznal,
+        COALESCE(s.km, 0) AS km,
+        COALESCE(s.fuel_liters, 0) AS fuel_liters,
+        COALESCE(s.fuel_price, 0) AS fuel_price,
+        {FUEL_COST_SQL} AS fuel_cost,
+        COALESCE(ss.nal + ss.card + ss.tips, 0) AS income,
+        COALESCE(ss.nal + ss.card + ss.tips, 0) - {FUEL_COST_SQL} AS profit,
+        CASE WHEN s.closed_ts > s.opened_ts THEN s.closed_ts - s.opened_ts END AS seconds
+    FROM shifts s
+    LEFT JOIN shift_summary ss ON ss.shift_id = s.id
+    WHERE s.is_open = 0
+      AND s.date_ts >= :start
+      AND s.date_ts < :end
+"""
+
+SHIFT_COLUMNS = [
+    "date",
+    "nal",
+    "card",
+    "tips",
+    "beznal",
+    "km",
+    "fuel_liters",
+    "fuel_price",
+    "income",
+    "fuel_cost",
+    "profit",
+    "hours",
+    "profit_per_km",
+    "profit_per_hour",
+]
+
+SHIFTS_SQL = f"""
+    WITH m AS ({SHIFT_METRICS_SQL.format(bucket="NULL")})
+    SELECT
+        date, nal, card, tips, beznal, km, fuel_liters, fuel_price,
+        income, fuel_cost, profit,
+        seconds / 3600.0,
+        CASE WHEN km > 0 THEN profit * 1.0 / km END,
+        CASE WHEN seconds > 0 THEN profit * 3600.0 / seconds END
+    FROM m
+    ORDER BY date_ts, shift_id
+"""
+
+ROLLUP_COLUMNS = [
+    "bucket",
+    "shifts",
+    "orders",
+    "nal",
+    "card",
+    "tips",
+    "beznal",
+    "km",
+    "fuel_liters",
+    "fuel_cost",
+    "income",
+    "profit",
+    "hours",
+    "profit_per_km",
+    "profit_per_hour",
+    "income_running",
+    "profit_running",
+    "beznal_running",
+]
+
+ROLLUP_SQL = """
+    WITH m AS ({metrics}),
+    buckets AS (
+        SELECT
+            bucket,
+            COUNT(*) AS shifts,
+            SUM(orders) AS orders,
+            SUM(nal) AS nal,
+            SUM(card) AS card,
+            SUM(tips) AS tips,
+            SUM(beznal) AS beznal,
+            SUM(km) AS km,
+            SUM(fuel_liters) AS fuel_liters,
+            SUM(fuel_cost) AS fuel_cost,
+            SUM(income) AS income,
+            SUM(profit) AS profit,
+            SUM(seconds) AS seconds,
+            SUM(CASE WHEN km > 0 THEN profit END) AS profit_with_km,
+            SUM(CASE WHEN seconds > 0 THEN profit END) AS profit_with_time
+        FROM m
+        GROUP BY bucket
+    )
+    SELECT
+        bucket, shifts, orders, nal, card, tips, beznal, km, fuel_liters, fuel_cost,
+        income, profit,
+        seconds / 3600.0,
+        CASE WHEN km > 0 THEN profit_with_km * 1.0 / km END,
+        CASE WHEN seconds > 0 THEN profit_with_time * 3600.0 / seconds END,
+        SUM(income) OVER (ORDER BY bucket),
+        SUM(profit) OVER (ORDER BY bucket),
+        SUM(beznal) OVER (ORDER BY bucket)
+    FROM buckets
+    ORDER BY bucket
+"""
+
+
+def _as_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _date_params(start, end) -> dict:
+    """[start, end] включительно -> полуинтервал epoch-секунд."""
+    start, end = _as_date(start), _as_date(end)
+    return {
+        "start": dates.date_to_epoch(start.isoformat()),
+        "end": dates.date_to_epoch((end + timedelta(days=1)).isoformat()),
+    }
+
+
+def _rollup(params: dict, bucket_sql: str) -> pd.DataFrame:
+    import pandas as pd  # pandas грузится при первом отчёте, а не при импорте
+
+    cur = db.get_connection().execute(
+        ROLLUP_SQL.format(metrics=SHIFT_METRICS_SQL.format(bucket=bucket_sql)),
+        params,
+    )
+    return pd.DataFrame.from_records(cur.fetchall(), columns=ROLLUP_COLUMNS)
+
+
+def rollup(start, end, granularity: str = "day") -> pd.DataFrame:
+    """
+    Итоги закрытых смен за [start, end] (даты включительно) по корзинам.
+
+    granularity — day / week / month / year. Колонки — ROLLUP_COLUMNS;
+    суммы в копейках, нарастающие итоги — с начала периода.
+    """
+    if granularity not in BUCKET_SQL:
+        raise ValueError(f"Неизвестная группировка: {granularity}")
+    return _rollup(_date_params(start, end), BUCKET_SQL[granularity])
+
+
+def period_totals(start_ts: int, end_ts: int):
+    """Итоги за [start_ts, end_ts) одной строкой (dict) или None без смен."""
+    df = _rollup({"start": start_ts, "end": end_ts}, "'period'")
+    if df.empty:
+        return None
+    return df.iloc[0].to_dict()
+
+
+def shift_metrics(start_ts: int, end_ts: int) -> pd.DataFrame:
+    """Закрытые смены за [start_ts, end_ts) с экономикой, колонки SHIFT_COLUMNS."""
+    import pandas as pd
+
+    cur = db.get_connection().execute(SHIFTS_SQL, {"start": start_ts, "end": end_ts})
+    return pd.DataFrame.from_records(cur.fetchall(), columns=SHIFT_COLUMNS)
+
+
+def data_range():
+    """(первая, последняя) дата закрытых смен или None, если смен нет."""
+    row = db.get_connection().execute(
+        """
+        SELECT MIN(date_ts), MAX(date_ts)
+        FROM shifts
+        WHERE is_open = 0 AND date_ts IS NOT NULL
+        """
+    ).fetchone()
+    if row[0] is None:
+        return None
+    return dates.from_epoch(row[0]).date(), dates.from_epoch(row[1]).date()
+
+
+def available_months():
+    """Месяцы ГГГГ-ММ закрытых смен с заказами, новые сверху."""
+    rows = db.get_connection().execute(
+        """
+        SELECT DISTINCT strftime('%Y-%m', date_ts, 'unixepoch')
+        FROM shifts
+        WHERE is_open = 0
+          AND date_ts IS NOT NULL
+          AND EXISTS (SELECT 1 FROM shift_summary ss WHERE ss.shift_id = shifts.id)
+        ORDER BY 1 DESC
+        """
+    ).fetchall()
+    return [val for (val,) in rows]
+
+
+def orders_by_hour(date_str: str) -> dict:
+    """{час: число заказов} закрытой смены за дату ГГГГ-ММ-ДД."""
+    rows = db.get_connection().execute(
+        """
+        SELECT CAST(strftime('%H', o.ordered_at, 'unixepoch') AS INTEGER), COUNT(*)
+        FROM shifts s
+        JOIN orders o ON o.shift_id = s.id
+        WHERE s.date_ts = ?
+          AND s.is_open = 0
+          AND o.ordered_at IS NOT NULL
+        GROUP BY 1
+        """,
+        (dates.date_to_epoch(date_str),),
+    ).fetchall()
+    return dict(rows)
@@ -0,0 +1,128 @@
+"""
+Смены и их заказы: открытие/закрытие, последние заказы и страницы ранних.
+
+Все функции работают через taxi.db и не зависят от Streamlit — их
+вызывают страницы приложения, бенчмарки и скрипты.
+"""
+
+from datetime import datetime
+
+from taxi import dates, db
+from taxi.summary import get_shift_summary
+
+
+# ===== ОТКРЫТИЕ / ЗАКРЫТИЕ =====
+def get_open_shift():
+    """Возвращает (id, date) открытой смены или None."""
+    cursor = db.get_connection().execute(
+        "SELECT id, date FROM shifts WHERE is_open = 1 LIMIT 1"
+    )
+    return cursor.fetchone()
+
+
+def open_shift(date_str: str) -> int:
+    now = datetime.now()
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO shifts (date, date_ts, is_open, opened_at, opened_ts) "
+            "VALUES (?, ?, 1, ?, ?)",
+            (
+                date_str,
+                dates.date_to_epoch(date_str),
+                now.strftime("%Y-%m-%d %H:%M:%S"),
+                dates.to_epoch(now),
+            ),
+        )
+    return cursor.lastrowid
+
+
+def close_shift(shift_id: int, km: int, liters: float, fuel_price: float):
+    now = datetime.now()
+    with db.transaction() as conn:
+        conn.execute(
+            """
+            UPDATE shifts
+            SET is_open = 0, km = ?, fuel_liters = ?, fuel_price = ?,
+                closed_at = ?, closed_ts = ?
+            WHERE id = ?
+            """,
+            (
+                km,
+                liters,
+                fuel_price,
+                now.strftime("%Y-%m-%d %H:%M:%S"),
+                dates.to_epoch(now),
+                shift_id,
+            ),
+        )
+
+
+def get_closed_shift_id(date_str: str):
+    """id ЗАКРЫТОЙ смены по дате ГГГГ-ММ-ДД или None."""
+    row = db.get_connection().execute(
+        "SELECT id FROM shifts WHERE date_ts = ? AND is_open = 0 ORDER BY id LIMIT 1",
+        (dates.date_to_epoch(date_str),),
+    ).fetchone()
+    return row[0] if row else None
+
+
+# ===== ЗАКАЗЫ СМЕНЫ =====
+def get_max_order_id() -> int:
+    return db.get_connection().execute(
+        "SELECT COALESCE(MAX(id), 0) FROM orders"
+    ).fetchone()[0]
+
+
+def get_latest_orders(shift_id, limit: int):
+    """Последние limit заказов смены в порядке добавления (первая колонка — id)."""
+    cursor = db.get_connection().execute(
+        """
+        SELECT id, pay_type, amount, tips, commission, total, beznal_added, order_time
+        FROM orders
+        WHERE shift_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (shift_id, limit),
+    )
+    return cursor.fetchall()[::-1]
+
+
+def get_older_orders_page(shift_id, before_id: int, page: int, page_size: int):
+    """Страница заказов раньше before_id, новые сверху."""
+    cursor = db.get_connection().execute(
+        """
+        SELECT pay_type, amount, tips, total, order_time
+        FROM orders
+        WHERE shift_id = ? AND id < ?
+        ORDER BY id DESC
+        LIMIT ? OFFSET ?
+        """,
+        (shift_id, before_id, page_size, page * page_size),
+    )
+    return cursor.fetchall()
+
+
+SHIFT_ORDERS_SQL = """
+    SELECT pay_type, amount, tips, beznal_added, total, order_time
+    FROM orders
+    WHERE shift_id = ?
+    ORDER BY id
+"""
+
+
+def get_shift_orders(shift_id):
+    """[(pay_type, amount, tips, beznal_added, total, order_time)] в порядке добавления."""
+    return db.get_connection().execute(SHIFT_ORDERS_SQL, (shift_id,)).fetchall()
+
+
+def get_shift_totals(shift_id):
+    """Итоги смены (копейки) из shift_summary — одна строка по ключу."""
+    summary = get_shift_summary(shift_id)
+    return {
+        "нал": summary["nal"],
+        "карта": summary["card"],
+        "чаевые": summary["tips"],
+        "безнал_смена": summary["beznal"],
+        "заказов": summary["orders_count"],
+    }
@@ -0,0 +1,185 @@
+"""
+Сводка по сменам (shift_summary), которую ведут триггеры на orders.
+
+Итоги смены читаются одной строкой по первичному ключу вместо агрегации
+всех её заказов. verify_shift_summary() пересобирает сводку по сырым
+заказам и сравнивает с хранимой.
+"""
+
+from taxi import db, money
+
+SUMMARY_FIELDS = (
+    "nal",
+    "card",
+    "tips",
+    "beznal",
+    "orders_count",
+)
+
+# как в SQL различаются нал и карта: текущая схема — целый pay_type,
+# до миграции v8 — текст в колонке type (нужно миграции v5)
+PAY_ENUM = {"pay": "pay_type", "nal": str(money.PAY_NAL), "card": str(money.PAY_CARD)}
+PAY_TEXT = {"pay": "type", "nal": "'нал'", "card": "'карта'"}
+
+# сводка «с нуля» по сырым заказам — те же формулы, что в триггерах
+SUMMARY_FROM_ORDERS_SQL = """
+    SELECT
+        shift_id,
+        COALESCE(SUM(CASE WHEN {pay} = {nal} THEN total - COALESCE(tips, 0) END), 0),
+        COALESCE(SUM(CASE WHEN {pay} = {card} THEN total - COALESCE(tips, 0) END), 0),
+        COALESCE(SUM(tips), 0),
+        COALESCE(SUM(beznal_added), 0),
+        COUNT(*)
+    FROM orders
+    WHERE shift_id IS NOT NULL
+    GROUP BY shift_id
+"""
+
+
+def create_summary_triggers(conn, pay=PAY_ENUM):
+    """Триггеры INSERT/UPDATE/DELETE на orders, поддерживающие shift_summary."""
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_orders_summary_insert
+        AFTER INSERT ON orders
+        WHEN NEW.shift_id IS NOT NULL
+        BEGIN
+            INSERT INTO shift_summary
+                (shift_id, nal, card, tips, beznal, orders_count)
+            VALUES (
+                NEW.shift_id,
+                CASE WHEN NEW.{pay} = {nal} THEN NEW.total - COALESCE(NEW.tips, 0) ELSE 0 END,
+                CASE WHEN NEW.{pay} = {card} THEN NEW.total - COALESCE(NEW.tips, 0) ELSE 0 END,
+                COALESCE(NEW.tips, 0),
+                COALESCE(NEW.beznal_added, 0),
+                1
+            )
+            ON CONFLICT (shift_id) DO UPDATE SET
+                nal = nal + excluded.nal,
+                card = card + excluded.card,
+                tips = tips + excluded.tips,
+                beznal = beznal + excluded.beznal,
+                orders_count = orders_count + 1;
+        END
+        """.format(**pay)
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_orders_summary_delete
+        AFTER DELETE ON orders
+        WHEN OLD.shift_id IS NOT NULL
+        BEGIN
+            UPDATE shift_summary SET
+                nal = nal - CASE WHEN OLD.{pay} = {nal} THEN OLD.total - COALESCE(OLD.tips, 0) ELSE 0 END,
+                card = card - CASE WHEN OLD.{pay} = {card} THEN OLD.total - COALESCE(OLD.tips, 0) ELSE 0 END,
+                tips = tips - COALESCE(OLD.tips, 0),
+                beznal = beznal - COALESCE(OLD.beznal_added, 0),
+                orders_count = orders_count - 1
+            WHERE shift_id = OLD.shift_id;
+            DELETE FROM shift_summary
+            WHERE shift_id = OLD.shift_id AND orders_count = 0;
+        END
+        """.format(**pay)
+    )
+    # UPDATE = снять старую строку со своей смены и добавить новую
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_orders_summary_update
+        AFTER UPDATE OF shift_id, {pay}, total, tips, beznal_added ON orders
+        BEGIN
+            UPDATE shift_summary SET
+                nal = nal - CASE WHEN OLD.{pay} = {nal} THEN OLD.total - COALESCE(OLD.tips, 0) ELSE 0 END,
+                card = card - CASE WHEN OLD.{pay} = {card} THEN OLD.total - COALESCE(OLD.tips, 0) ELSE 0 END,
+                tips = tips - COALESCE(OLD.tips, 0),
+                beznal = beznal - COALESCE(OLD.beznal_added, 0),
+                orders_count = orders_count - 1
+            WHERE OLD.shift_id IS NOT NULL AND shift_id = OLD.shift_id;
+            DELETE FROM shift_summary
+            WHERE OLD.shift_id IS NOT NULL AND shift_id = OLD.shift_id AND orders_count = 0;
+            INSERT INTO shift_summary
+                (shift_id, nal, card, tips, beznal, orders_count)
+            SELECT
+                NEW.shift_id,
+                CASE WHEN NEW.{pay} = {nal} THEN NEW.total - COALESCE(NEW.tips, 0) ELSE 0 END,
+                CASE WHEN NEW.{pay} = {card} THEN NEW.total - COALESCE(NEW.tips, 0) ELSE 0 END,
+                COALESCE(NEW.tips, 0),
+                COALESCE(NEW.beznal_added, 0),
+                1
+            WHERE NEW.shift_id IS NOT NULL
+            ON CONFLICT (shift_id) DO UPDATE SET
+                nal = nal + excluded.nal,
+                card = card + excluded.card,
+                tips = tips + excluded.tips,
+                beznal = beznal + excluded.beznal,
+                orders_count = orders_count + 1;
+        END
+        """.format(**pay)
+    )
+
+
+def rebuild_shift_summary(conn, pay=PAY_ENUM):
+    """Заполняет shift_summary заново по сырым заказам."""
+    conn.execute("DELETE FROM shift_summary")
+    conn.execute(
+        "INSERT INTO shift_summary "
+        "(shift_id, nal, card, tips, beznal, orders_count) "
+        + SUMMARY_FROM_ORDERS_SQL.format(**pay)
+    )
+
+
+def get_shift_summary(shift_id):
+    """Строка сводки смены как dict (пустые итоги, если заказов нет)."""
+    row = db.get_connection().execute(
+        f"SELECT {', '.join(SUMMARY_FIELDS)} FROM shift_summary WHERE shift_id = ?",
+        (shift_id,),
+    ).fetchone()
+    if row is None:
+        return {
+            "nal": 0,
+            "card": 0,
+            "tips": 0,
+            "beznal": 0,
+            "orders_count": 0,
+        }
+    return dict(zip(SUMMARY_FIELDS, row))
+
+
+def verify_shift_summary(rebuild: bool = False) -> dict:
+    """
+    Сравнивает shift_summary с агрегатами по сырым заказам.
+
+    Возвращает {"checked", "mismatches", "rebuilt"}: mismatches —
+    список (shift_id, поле, хранится, должно быть). При rebuild=True и
+    расхождениях сводка пересобирается в той же транзакции.
+    """
+    with db.transaction() as conn:
+        actual = {
+            row[0]: dict(zip(SUMMARY_FIELDS, row[1:]))
+            for row in conn.execute(SUMMARY_FROM_ORDERS_SQL.format(**PAY_ENUM))
+        }
+        stored = {
+            row[0]: dict(zip(SUMMARY_FIELDS, row[1:]))
+            for row in conn.execute(
+                f"SELECT shift_id, {', '.join(SUMMARY_FIELDS)} FROM shift_summary"
+            )
+        }
+
+        mismatches = []
+        for shift_id in sorted(actual.keys() | stored.keys()):
+            want = actual.get(shift_id)
+            have = stored.get(shift_id)
+            if want is None or have is None:
+                mismatches.append(
+                    (shift_id, "строка", have is not None, want is not None)
+                )
+                continue
+            for field in SUMMARY_FIELDS:
+                if have[field] != want[field]:
+                    mismatches.append((shift_id, field, have[field], want[field]))
+
+        rebuilt = False
+        if rebuild and mismatches:
+            rebuild_shift_summary(conn)
+            rebuilt = True
+
+    return {"checked": len(actual), "mismatches": mismatches, "rebuilt": rebuilt}
@@ -0,0 +1,211 @@
+"""
+Версии тарифа (процент водителю для нала и карты) с датами действия.
+
+Версия действует на полуинтервале [valid_from, valid_to) по дате смены,
+valid_to = NULL — действует до сих пор. Версии не пересекаются и
+покрывают всю шкалу дат: базовая начинается с MIN_DATE. Каждый заказ
+хранит tariff_id версии, по которой он посчитан, поэтому смена тарифа
+пересчитывает только заказы из своего окна дат.
+"""
+
+import time
+from datetime import datetime
+
+from taxi import dates, db, ledger, money
+
+DEFAULT_RATE_NAL = 0.78    # процент для нала (для расчёта комиссии)
+DEFAULT_RATE_CARD = 0.75   # процент для карты
+MIN_DATE = "0000-01-01"
+
+
+def calc_order(pay_type: int, amount: int, tips: int, rate_nal: float, rate_card: float):
+    """(commission, total, beznal_added) одного заказа, всё в копейках."""
+    if pay_type == money.PAY_NAL:
+        commission = money.share(amount, 1 - rate_nal)
+        total = amount + tips
+        beznal_added = -commission
+    else:
+        final_wo_tips = money.share(amount, rate_card)
+        commission = amount - final_wo_tips
+        total = final_wo_tips + tips
+        beznal_added = final_wo_tips
+    return commission, total, beznal_added
+
+
+# те же формулы, что calc_order, для UPDATE по набору заказов (pay_type 0 — нал)
+PRICE_ASSIGNMENTS_SQL = """
+    commission = CASE pay_type
+        WHEN 0 THEN CAST(amount * (1 - :rate_nal) + 0.5 AS INTEGER)
+        ELSE amount - CAST(amount * :rate_card + 0.5 AS INTEGER)
+    END,
+    total = CASE pay_type
+        WHEN 0 THEN amount + tips
+        ELSE CAST(amount * :rate_card + 0.5 AS INTEGER) + tips
+    END,
+    beznal_added = CASE pay_type
+        WHEN 0 THEN -CAST(amount * (1 - :rate_nal) + 0.5 AS INTEGER)
+        ELSE CAST(amount * :rate_card + 0.5 AS INTEGER)
+    END
+"""
+
+# заказы смен из окна дат [:valid_from, :valid_to)
+WINDOW_ORDERS_SQL = """
+    shift_id IN (
+        SELECT id FROM shifts
+        WHERE date >= :valid_from
+          AND (:valid_to IS NULL OR date < :valid_to)
+    )
+"""
+
+
+# ===== ЧТЕНИЕ =====
+def list_tariffs():
+    """[(id, valid_from, valid_to, rate_nal, rate_card)] по возрастанию valid_from."""
+    return db.get_connection().execute(
+        "SELECT id, valid_from, valid_to, rate_nal, rate_card "
+        "FROM tariffs ORDER BY valid_from"
+    ).fetchall()
+
+
+def get_tariff(date_str: str):
+    """(id, rate_nal, rate_card) версии, действующей на дату смены."""
+    return db.get_connection().execute(
+        """
+        SELECT id, rate_nal, rate_card
+        FROM tariffs
+        WHERE valid_from <= ?
+        ORDER BY valid_from DESC
+        LIMIT 1
+        """,
+        (date_str,),
+    ).fetchone()
+
+
+# ===== ПЕРЕСЧЁТ =====
+def reprice_window(conn, tariff_id, rate_nal, rate_card, valid_from, valid_to):
+    """
+    Пересчитывает заказы окна дат одним UPDATE.
+
+    Возвращает (число заказов, изменение суммы beznal_added в копейках).
+    """
+    params = {
+        "tariff_id": tariff_id,
+        "rate_nal": rate_nal,
+        "rate_card": rate_card,
+        "valid_from": valid_from,
+        "valid_to": valid_to,
+    }
+    before = conn.execute(
+        f"SELECT COALESCE(SUM(beznal_added), 0) FROM orders WHERE {WINDOW_ORDERS_SQL}",
+        params,
+    ).fetchone()[0]
+    rows = conn.execute(
+        f"""
+        UPDATE orders
+        SET tariff_id = :tariff_id, {PRICE_ASSIGNMENTS_SQL}
+        WHERE {WINDOW_ORDERS_SQL}
+        """,
+        params,
+    ).rowcount
+    after = conn.execute(
+        f"SELECT COALESCE(SUM(beznal_added), 0) FROM orders WHERE {WINDOW_ORDERS_SQL}",
+        params,
+    ).fetchone()[0]
+    return rows, after - before
+
+
+def set_tariff(rate_nal: float, rate_card: float, valid_from: str) -> dict:
+    """
+    Вводит тариф с даты valid_from до начала следующей версии.
+
+    Версия, в окно которой попадает valid_from, делится на две (или
+    обновляется, если начинается ровно с valid_from). Пересчитываются
+    только заказы нового окна, накопленный безнал меняется на разницу —
+    записями журнала по дням этих заказов.
+    Возвращает {"tariff_id", "valid_from", "valid_to", "rows", "beznal_delta", "seconds"}.
+    """
+    started = time.perf_counter()
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with db.transaction() as conn:
+        tariff_id, cur_from, valid_to = conn.execute(
+            """
+            SELECT id, valid_from, valid_to
+            FROM tariffs
+            WHERE valid_from <= ?
+            ORDER BY valid_from DESC
+            LIMIT 1
+            """,
+            (valid_from,),
+        ).fetchone()
+
+        if cur_from == valid_from:
+            conn.execute(
+                "UPDATE tariffs SET rate_nal = ?, rate_card = ? WHERE id = ?",
+                (rate_nal, rate_card, tariff_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE tariffs SET valid_to = ? WHERE id = ?",
+                (valid_from, tariff_id),
+            )
+            tariff_id = conn.execute(
+                """
+                INSERT INTO tariffs (rate_nal, rate_card, valid_from, valid_to, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (rate_nal, rate_card, valid_from, valid_to, now),
+            ).lastrowid
+
+        rows, beznal_delta = reprice_window(
+            conn, tariff_id, rate_nal, rate_card, valid_from, valid_to
+        )
+        # по дням заказов окна; +1 день — заказы последней смены после полуночи
+        ledger.align_to_orders(
+            conn,
+            ledger.KIND_TARIFF,
+            None if valid_from == MIN_DATE else dates.date_to_epoch(valid_from),
+            None if valid_to is None else dates.date_to_epoch(valid_to) + dates.DAY,
+            note=f"тариф с {valid_from}",
+        )
+
+    return {
+        "tariff_id": tariff_id,
+        "valid_from": valid_from,
+        "valid_to": valid_to,
+        "rows": rows,
+        "beznal_delta": beznal_delta,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def recalc_all() -> dict:
+    """
+    Пересчитывает commission/total/beznal_added всех заказов (по одному
+    UPDATE на версию тарифа) и заново собирает накопленный безнал —
+    всё в одной транзакции.
+
+    Возвращает {"rows", "seconds", "rows_per_sec", "total_beznal"}.
+    """
+    started = time.perf_counter()
+    rows = 0
+    with db.transaction() as conn:
+        for tariff_id, valid_from, valid_to, rate_nal, rate_card in list_tariffs():
+            window_rows, _ = reprice_window(
+                conn, tariff_id, rate_nal, rate_card, valid_from, valid_to
+            )
+            rows += window_rows
+
+        total_beznal = conn.execute(
+            "SELECT COALESCE(SUM(beznal_added), 0) FROM orders"
+        ).fetchone()[0]
+        ledger.align_to_orders(conn, ledger.KIND_RECALC)
+        # перенос и ручные корректировки пересчёт снимает: баланс = сумма заказов
+        ledger.set_balance(conn, total_beznal, kind=ledger.KIND_MANUAL, note="пересчёт базы")
+    seconds = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else 0.0,
+        "total_beznal": total_beznal,
+    }
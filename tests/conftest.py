@@ -0,0 +1,13 @@
+import pytest
+
+from taxi import db
+from taxi.migrations import ensure_schema
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Пустая БД текущей схемы во временном каталоге."""
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "taxi.db"))
+    ensure_schema()
+    yield db.DB_NAME
+    db.close_all_connections()
@@ -0,0 +1,18 @@
+import threading
+
+from taxi import db
+
+
+def test_connections_of_finished_threads_are_closed(temp_db):
+    # Streamlit гоняет каждый прогон скрипта в новом потоке
+    def rerun():
+        db.get_connection().execute("SELECT 1").fetchone()
+
+    for _ in range(200):
+        thread = threading.Thread(target=rerun)
+        thread.start()
+        thread.join()
+
+    db.get_connection()
+    # соединение этого потока и, возможно, наблюдателя data_generation()
+    assert len(db._all_connections) <= 2
@@ -0,0 +1,26 @@
+from taxi import dates, money, reports
+from taxi.orders import add_orders
+from taxi.shifts import close_shift, open_shift
+
+
+def test_shift_without_orders_keeps_its_fuel_cost(temp_db):
+    busy = open_shift("2024-05-01")
+    add_orders(busy, [(money.PAY_CARD, 100000, 0, "10:00")])
+    close_shift(busy, 100, 10.0, 50.0)
+    idle = open_shift("2024-05-02")
+    close_shift(idle, 20, 4.0, 50.0)
+
+    start, end = dates.month_range("2024-05")
+    shifts = reports.shift_metrics(start, end)
+    assert shifts["date"].tolist() == ["2024-05-01", "2024-05-02"]
+    idle_row = shifts.iloc[1]
+    assert idle_row["income"] == 0
+    assert idle_row["fuel_cost"] == 20000
+    assert idle_row["profit"] == -20000
+
+    totals = reports.period_totals(start, end)
+    assert totals["shifts"] == 2
+    assert totals["fuel_cost"] == 70000
+    # водителю по карте 75 % суммы заказа
+    assert totals["income"] == 75000
+    assert totals["profit"] == 75000 - 70000